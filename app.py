@@ -12,18 +12,39 @@ import traceback
 import pytz
 import datetime
 import math
-
+import json
+import queue
+import heapq
+import socket
+import uuid
+import atexit
+import csv
+import io
+import tempfile
+import gzip
+import hashlib
+import mimetypes
+from collections import namedtuple
+
+import click
 from flask import (
     Flask, request, render_template, redirect,
-    url_for, flash, session
+    url_for, flash, session, Response, stream_with_context,
+    g, has_request_context, send_from_directory
 )
 from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
 from sqlalchemy import (
-    create_engine, Column, Integer, String,
-    Boolean, ForeignKey, func, or_
+    create_engine, event, Column, Integer, String,
+    Boolean, ForeignKey, Index, Table, func, or_, update, insert, select,
+    delete, inspect, text
+)
+from sqlalchemy.orm import (
+    sessionmaker, relationship, declarative_base,
+    selectinload
 )
-from sqlalchemy.orm import sessionmaker, relationship, declarative_base
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.pool import QueuePool
 
 # ─────────────────────────────────────────────────────────
 # 0) 환경변수
@@ -40,19 +61,141 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 
-DB_URL = (
+STOCK_STRICT = os.getenv("STOCK_STRICT", "0") == "1"    # 재고 부족 주문 확정 거절 여부
+BUSINESS_DAY_CUTOFF_HOUR = int(os.getenv("BUSINESS_DAY_CUTOFF_HOUR", "6"))  # 이 시각 전은 전날 영업일
+
+# 주문 제출 유입 제어: 테이블당 ORDER_BURST 번까지 연속, 이후 ORDER_REFILL_SEC 마다 1번.
+# 프로세스당 동시에 처리하는 주문 제출은 ORDER_MAX_INFLIGHT 개 (커넥션 풀 15 보다 작게)
+ORDER_BURST        = int(os.getenv("ORDER_BURST", "5"))
+ORDER_REFILL_SEC   = float(os.getenv("ORDER_REFILL_SEC", "12"))
+ORDER_MAX_INFLIGHT = int(os.getenv("ORDER_MAX_INFLIGHT", "8"))
+
+# worker 간 캐시 무효화/이벤트 전달 backend
+#   local            : 프로세스 하나 (개발용, 기본값)
+#   db               : event_outbox 테이블 폴링 (추가 의존성 없음)
+#   redis://host/0   : Redis pub/sub (redis 패키지 필요)
+EVENT_BUS = os.getenv("EVENT_BUS", "local")
+EVENT_POLL_SEC = float(os.getenv("EVENT_POLL_SEC", "0.2"))
+
+# 주문 이벤트 로그 → 파생 표(projection) 반영 주기, 그리고 id 가 빈 구간을
+# "롤백된 것" 으로 보고 건너뛰기까지 기다리는 시간 (초)
+PROJECTION_POLL_SEC = float(os.getenv("PROJECTION_POLL_SEC", "1"))
+PROJECTION_GAP_SEC  = int(os.getenv("PROJECTION_GAP_SEC", "10"))
+
+# DATABASE_URL 을 주면 그것을 그대로 사용 (벤치마크용 로컬 SQLite 등)
+DB_URL = os.getenv("DATABASE_URL") or (
     f"mysql+pymysql://{DB_USER}:{DB_PASS}"
     f"@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
 )
 
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")   # /metrics 를 로그인 없이 긁을 때 Bearer 토큰
+
+# 여러 worker 가 같은 세션 쿠키를 읽으려면 반드시 고정값이어야 한다
+SECRET_KEY = os.getenv("SECRET_KEY")
+# 컴파일된 Jinja 템플릿 캐시 위치 (빈 값이면 사용 안 함)
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR",
+                            os.path.join(tempfile.gettempdir(), "aif-jinja-cache"))
+
+# ─────────────────────────────────────────────────────────
+# 0-1) 성능 계측 (Prometheus text format)
+# ─────────────────────────────────────────────────────────
+class Metrics:
+    """프로세스 내 counter / histogram / gauge 저장소"""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}         # (name, labels) -> float
+        self._histograms = {}       # (name, labels) -> [bucket counts..., sum, count]
+        self._gauges = {}           # name -> callable() -> [(labels, value)]
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * (len(self.BUCKETS) + 2)
+            for i, le in enumerate(self.BUCKETS):
+                if value <= le:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def gauge(self, name, fn):
+        self._gauges[name] = fn
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines, seen = [], set()
+
+        def header(name):
+            if name not in seen and name in self._help:
+                kind, text = self._help[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+            seen.add(name)
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), h in histograms:
+            header(name)
+            for i, le in enumerate(self.BUCKETS):
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', le)])} {h[i]}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {h[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {h[-2]:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {h[-1]}")
+        for name, fn in sorted(self._gauges.items()):
+            header(name)
+            for labels, value in fn():
+                lines.append(f"{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+metrics.describe("http_request_duration_seconds", "histogram", "엔드포인트별 요청 처리 시간")
+metrics.describe("http_request_sql_statements", "histogram", "요청 하나가 실행한 SQL 문 수")
+metrics.describe("sql_statement_duration_seconds", "histogram", "SQL 문 실행 시간")
+metrics.describe("db_pool_checkout_wait_seconds", "histogram", "커넥션 풀 대기 시간")
+metrics.describe("scheduler_run_seconds", "histogram", "백그라운드 작업 1회 실행 시간")
+
+class TimedQueuePool(QueuePool):
+    """커넥션을 얻기까지 기다린 시간을 기록하는 QueuePool"""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db_pool_checkout_wait_seconds", time.perf_counter() - t0)
+
 # ─────────────────────────────────────────────────────────
 # 1) Flask & SQLAlchemy
 # ─────────────────────────────────────────────────────────
 app = Flask(__name__, static_folder="static")
-app.secret_key = os.urandom(24)
+app.secret_key = SECRET_KEY or os.urandom(24)
 
 engine = create_engine(
     DB_URL,
+    poolclass=TimedQueuePool,
     pool_size=10, max_overflow=5,
     pool_timeout=30, pool_recycle=1800,
     echo=False
@@ -63,11 +206,43 @@ Base = declarative_base()
 # ─────────────────────────────────────────────────────────
 # 2) 시간 유틸
 # ─────────────────────────────────────────────────────────
+KST = pytz.timezone("Asia/Seoul")
+
 def current_hhmmss() -> str:
     """한국시간 HHMMSS 문자열 반환"""
-    now = datetime.datetime.now(pytz.timezone("Asia/Seoul"))
+    now = datetime.datetime.now(KST)
     return now.strftime("%H%M%S")
 
+def hhmmss_to_epoch(hhmmss) -> float:
+    """
+    HHMMSS(오늘 또는 자정 이전) → epoch 초.
+    지금보다 미래 시각이면 어제 시각으로 본다.
+    """
+    hhmmss = f"{int(hhmmss):06d}"
+    now = datetime.datetime.now(KST)
+    t = now.replace(hour=int(hhmmss[:2]), minute=int(hhmmss[2:4]),
+                    second=int(hhmmss[4:6]), microsecond=0)
+    if t > now:
+        t -= datetime.timedelta(days=1)
+    return t.timestamp()
+
+LEGACY_BUSINESS_DAY = "0000-00-00"     # 영업일 컬럼 도입 전 행 (날짜 불명)
+
+def business_day(now=None) -> str:
+    """영업일 'YYYY-MM-DD' (자정 넘어 새벽까지 이어지는 영업은 전날로 묶음)"""
+    now = now or datetime.datetime.now(KST)
+    return (now - datetime.timedelta(hours=BUSINESS_DAY_CUTOFF_HOUR)).strftime("%Y-%m-%d")
+
+def now_stamp():
+    """같은 순간의 (HHMMSS 정수, epoch 초, 영업일)"""
+    now = datetime.datetime.now(KST)
+    return int(now.strftime("%H%M%S")), int(now.timestamp()), business_day(now)
+
+def elapsed_minutes(epoch, hhmmss):
+    """epoch 기준 경과 분. epoch 가 없는 이전 데이터는 HHMMSS 로 추정"""
+    start = epoch if epoch is not None else hhmmss_to_epoch(hhmmss)
+    return int(time.time() - start) // 60
+
 def hhmmss_to_minutes(hhmmss_str: str) -> int:
     """HHMMSS → 하루 기준 분 단위(0–1439)"""
     h, m, s = int(hhmmss_str[:2]), int(hhmmss_str[2:4]), int(hhmmss_str[4:6])
@@ -84,6 +259,9 @@ class Menu(Base):
     category = Column(String(50), nullable=False)   # set, main, side, dessert, etc, drink
     stock    = Column(Integer, nullable=False, default=0)
     sold_out = Column(Boolean, default=False)
+    __table_args__ = (
+        Index("ix_menu_name", "name"),
+    )
 
 class Order(Base):
     __tablename__ = "orders"
@@ -99,7 +277,17 @@ class Order(Base):
     alertTime1  = Column(Integer, default=0)
     alertTime2  = Column(Integer, default=0)
     service     = Column(Boolean, default=False)
+    businessDay = Column(String(10))                       # 영업일 YYYY-MM-DD
+    createdTs   = Column(Integer)                          # epoch 초
+    confirmedTs = Column(Integer)                          # epoch 초
+    idempotencyKey = Column(String(64))                    # 주문서마다 브라우저가 만든 키 (재제출 식별)
     items       = relationship("OrderItem", back_populates="order")
+    __table_args__ = (
+        Index("ux_orders_idempotency", "idempotencyKey", unique=True),
+        Index("ix_orders_status_id", "status", "id"),
+        Index("ix_orders_day_status_id", "businessDay", "status", "id"),
+        Index("ix_orders_table_people_id", "tableNumber", "peopleCount", "id"),
+    )
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -111,6 +299,10 @@ class OrderItem(Base):
     deliveredQuantity= Column(Integer, default=0)
     order            = relationship("Order", back_populates="items")
     menu             = relationship("Menu")
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+        Index("ix_order_items_menu_order", "menu_id", "order_id"),
+    )
 
 class Log(Base):
     __tablename__ = "logs"
@@ -119,6 +311,23 @@ class Log(Base):
     role   = Column(String(50), nullable=False)
     action = Column(String(50), nullable=False)
     detail = Column(String(200), nullable=False)
+    businessDay = Column(String(10))           # 영업일 YYYY-MM-DD
+    ts     = Column(Integer)                   # epoch 초
+    __table_args__ = (
+        Index("ix_logs_time", "time"),
+        Index("ix_logs_day_id", "businessDay", "id"),
+        Index("ix_logs_role_id", "role", "id"),
+        Index("ix_logs_action_id", "action", "id"),
+    )
+
+LOG_ROLES   = ("admin", "kitchen", "system")
+LOG_ACTIONS = (
+    "CONFIRM_ORDER", "REJECT_ORDER", "COMPLETE_ORDER", "DELIVER_ITEM",
+    "DELIVER_TABLE", "ADMIN_SERVICE", "KITCHEN_DONE_ITEM",
+    "SOLDOUT_TOGGLE", "UPDATE_STOCK", "UPDATE_SETTINGS",
+    "EMPTY_TABLE", "BLOCK_TOGGLE",
+    "TIME_WARNING1", "TIME_WARNING2",
+)
 
 class Setting(Base):
     __tablename__ = "settings"
@@ -129,17 +338,103 @@ class Setting(Base):
     min_items_per_two = Column(Integer, default=1)    # 2명당 최소 주문 항목
     require_main      = Column(Boolean, default=True) # Main Dish 필수 여부
 
+class MenuComponent(Base):
+    """세트 메뉴 구성표 (BOM): 세트 1개당 구성 메뉴 수량"""
+    __tablename__ = "menu_components"
+    set_menu_id       = Column(Integer, ForeignKey("menu.id"), primary_key=True)
+    component_menu_id = Column(Integer, ForeignKey("menu.id"), primary_key=True)
+    quantity          = Column(Integer, nullable=False, default=1)
+
+class KitchenBacklog(Base):
+    __tablename__ = "kitchen_backlog"
+    menu_id     = Column(Integer, ForeignKey("menu.id"), primary_key=True)
+    outstanding = Column(Integer, nullable=False, default=0)   # paid 주문의 미조리 수량 합계
+
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_lease"
+    name      = Column(String(50), primary_key=True)
+    owner     = Column(String(100))
+    expiresAt = Column(Integer, nullable=False, default=0)   # epoch 초
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    version   = Column(Integer, primary_key=True, autoincrement=False)
+    name      = Column(String(100), nullable=False)
+    appliedAt = Column(Integer, nullable=False)   # epoch 초
+
 class TableState(Base):
     __tablename__ = "table_state"
     tableNumber = Column(String(50), primary_key=True)  # 'TAKEOUT' or '1'~'23'
     usageStart  = Column(Integer)                       # HHMMSS
+    usageStartTs= Column(Integer)                       # epoch 초
     blocked     = Column(Boolean, default=False)
 
+class SalesLedger(Base):
+    """영업일 × 10분 구간 × 메뉴별 매출 누계 (입금확인과 같은 트랜잭션에서 갱신)"""
+    __tablename__ = "sales_ledger"
+    businessDay = Column(String(10), primary_key=True)
+    bucket      = Column(Integer, primary_key=True, autoincrement=False)  # HHMM, 2130 = 21:30~21:39
+    menu_id     = Column(Integer, ForeignKey("menu.id"), primary_key=True, autoincrement=False)
+    quantity    = Column(Integer, nullable=False, default=0)
+    amount      = Column(Integer, nullable=False, default=0)   # 원
+
+class EventOutbox(Base):
+    """EVENT_BUS=db 일 때 worker 간 이벤트 전달용 (오래된 행은 주기적으로 삭제)"""
+    __tablename__ = "event_outbox"
+    id      = Column(Integer, primary_key=True, autoincrement=True)
+    ts      = Column(Integer, nullable=False)           # epoch 초
+    payload = Column(String(1000), nullable=False)      # JSON
+
+class OrderEvent(Base):
+    """
+    주문/재고/테이블 상태 변경 기록 (append-only, id 가 곧 offset).
+    변경과 같은 트랜잭션에서 추가되며 수정·삭제하지 않는다.
+    """
+    __tablename__ = "order_events"
+    id          = Column(Integer, primary_key=True, autoincrement=True)
+    type        = Column(String(30), nullable=False)    # EVENT_TYPES
+    ts          = Column(Integer, nullable=False)       # epoch 초 (기록 시각)
+    time        = Column(Integer, nullable=False)       # HHMMSS (주문 확정 이벤트는 confirmedAt)
+    businessDay = Column(String(10), nullable=False)    # 주문 이벤트는 주문의 영업일
+    role        = Column(String(50))
+    order_id    = Column(Integer)                       # orders.id (보관 후에도 남도록 FK 없음)
+    item_id     = Column(Integer)                       # order_items.id
+    menu_id     = Column(Integer)
+    tableNumber = Column(String(50))
+    quantity    = Column(Integer)                       # 수량 / 증감 / 인원 / 0·1 플래그
+    amount      = Column(Integer)                       # 원
+    __table_args__ = (
+        Index("ix_order_events_order_id", "order_id", "id"),
+        Index("ix_order_events_day_id", "businessDay", "id"),
+    )
+
+class ProjectionCheckpoint(Base):
+    """projection 별로 order_events 의 어디까지 반영했는지"""
+    __tablename__ = "projection_checkpoints"
+    name        = Column(String(50), primary_key=True)
+    lastEventId = Column(Integer, nullable=False, default=0)
+    updatedAt   = Column(Integer, nullable=False, default=0)   # epoch 초
+
+# 마감된 영업일의 주문/항목/로그 보관용 (archive-day 명령으로 이동)
+def archive_table(model, name, *indexes):
+    """모델과 같은 컬럼 구성의 보관 테이블 (FK·자동증가 없음)"""
+    cols = [Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False)
+            for c in model.__table__.columns]
+    return Table(name, Base.metadata, *cols, *indexes)
+
+orders_archive      = archive_table(Order, "orders_archive",
+                                    Index("ix_orders_archive_day", "businessDay"))
+order_items_archive = archive_table(OrderItem, "order_items_archive",
+                                    Index("ix_order_items_archive_order", "order_id"))
+logs_archive        = archive_table(Log, "logs_archive",
+                                    Index("ix_logs_archive_day", "businessDay"))
+
 # ─────────────────────────────────────────────────────────
 # 4) 초기화
 # ─────────────────────────────────────────────────────────
 def init_db():
     Base.metadata.create_all(bind=engine)
+    run_migrations()
     with SessionLocal() as db:
         if db.query(Menu).count() == 0:
             db.add_all([
@@ -164,25 +459,219 @@ def init_db():
             db.add(Setting(id=1, time_warning1=50, time_warning2=60,
                            total_tables=23, min_items_per_two=1, require_main=True))
         db.commit()
+        seed_legacy_components(db)
+        ensure_table_rows(db, db.query(Setting.total_tables).filter_by(id=1).scalar())
+        ensure_checkpoints(db)
+        if db.query(KitchenBacklog).count() == 0:
+            mark_projected(db, "kitchen_backlog")
+            rebuild_kitchen_backlog(db)
+        db.commit()
+
+# ─────────────────────────────────────────────────────────
+# 4-1) 스키마 마이그레이션
+#      create_all 은 기존 테이블을 바꾸지 않으므로, 운영 DB 에 필요한
+#      인덱스/컬럼 변경은 버전 번호가 붙은 migration 함수로 적용한다.
+#      새 DB 에서는 create_all 이 이미 만든 것을 확인만 하고 버전을 기록한다.
+# ─────────────────────────────────────────────────────────
+MIGRATIONS = []
+
+def migration(version, name):
+    def deco(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return deco
+
+def ensure_index(conn, index):
+    """같은 이름 또는 같은 컬럼 구성의 인덱스가 없을 때만 생성"""
+    cols = [c.name for c in index.columns]
+    for ix in inspect(conn).get_indexes(index.table.name):
+        if ix["name"] == index.name or ix["column_names"] == cols:
+            return False
+    index.create(bind=conn)
+    return True
+
+def ensure_column(conn, model, column_name):
+    """모델에 선언된 컬럼이 테이블에 없으면 ALTER TABLE ADD COLUMN"""
+    table = model.__table__
+    if column_name in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+        return False
+    col = table.c[column_name]
+    conn.execute(text(
+        f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(conn.dialect)}"
+    ))
+    return True
+
+def model_index(model, name):
+    return next(ix for ix in model.__table__.indexes if ix.name == name)
+
+@migration(1, "hot query indexes")
+def _migrate_hot_indexes(conn):
+    for model, name in [
+        (Order,     "ix_orders_status_id"),
+        (Order,     "ix_orders_table_people_id"),
+        (OrderItem, "ix_order_items_order_id"),
+        (OrderItem, "ix_order_items_menu_order"),
+        (Menu,      "ix_menu_name"),
+        (Log,       "ix_logs_time"),
+        (Log,       "ix_logs_role_id"),
+        (Log,       "ix_logs_action_id"),
+    ]:
+        ensure_index(conn, model_index(model, name))
+
+@migration(2, "business day / epoch timestamps")
+def _migrate_business_day(conn):
+    for model, col in [
+        (Order, "businessDay"), (Order, "createdTs"), (Order, "confirmedTs"),
+        (Log, "businessDay"), (Log, "ts"),
+        (TableState, "usageStartTs"),
+    ]:
+        ensure_column(conn, model, col)
+    # 이전 행에는 HHMMSS 만 있어 날짜를 알 수 없다 → 어떤 영업일보다도 앞선
+    # LEGACY_BUSINESS_DAY 로 표시한다. 오늘 화면/매출에는 섞이지 않고,
+    # 다음 archive-day 가 (businessDay < 오늘 이므로) 보관 테이블로 옮긴다.
+    conn.execute(update(Order.__table__)
+                 .where(Order.__table__.c.businessDay == None)
+                 .values(businessDay=LEGACY_BUSINESS_DAY))
+    conn.execute(update(Log.__table__)
+                 .where(Log.__table__.c.businessDay == None)
+                 .values(businessDay=LEGACY_BUSINESS_DAY))
+    ensure_index(conn, model_index(Order, "ix_orders_day_status_id"))
+    ensure_index(conn, model_index(Log, "ix_logs_day_id"))
+
+@migration(3, "sales ledger backfill")
+def _migrate_sales_ledger(conn):
+    # 테이블은 create_all 이 만든다. 기존 주문(보관분 포함)으로 누계를 채운다.
+    rebuild_sales_ledger(conn)
+
+@migration(4, "order idempotency key")
+def _migrate_idempotency_key(conn):
+    ensure_column(conn, Order, "idempotencyKey")
+    ensure_index(conn, model_index(Order, "ux_orders_idempotency"))
+
+def run_migrations():
+    """아직 적용되지 않은 migration 을 버전 순으로 적용"""
+    with engine.connect() as conn:
+        if conn.dialect.name == "mysql":
+            # 여러 프로세스가 동시에 시작해도 한 번만 적용되도록
+            conn.execute(text("SELECT GET_LOCK('aif_schema_migrations', 60)"))
+        try:
+            applied = set(conn.execute(select(SchemaMigration.version)).scalars())
+            conn.commit()
+            for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if version in applied:
+                    continue
+                fn(conn)
+                conn.execute(insert(SchemaMigration).values(
+                    version=version, name=name, appliedAt=int(time.time())))
+                conn.commit()
+                print(f"[migrate] {version}: {name}")
+        finally:
+            if conn.dialect.name == "mysql":
+                conn.execute(text("SELECT RELEASE_LOCK('aif_schema_migrations')"))
 
 # ─────────────────────────────────────────────────────────
 # 5) 헬퍼
 # ─────────────────────────────────────────────────────────
-def log_action(role, action, detail):
-    with SessionLocal() as db:
-        db.add(Log(time=int(current_hhmmss()), role=role,
-                   action=action, detail=detail))
-        db.commit()
+def log_action(role, action, detail, db=None):
+    """
+    db 를 넘기면 호출자의 트랜잭션에 Log 행을 추가한다 (커밋은 호출자가).
+    아니면 백그라운드 LogWriter 큐에 넣어 묶음으로 저장한다.
+    """
+    hhmmss, epoch, day = now_stamp()
+    row = {"time": hhmmss, "ts": epoch, "businessDay": day,
+           "role": role, "action": action, "detail": detail[:200]}
+    if db is not None:
+        db.add(Log(**row))
+    else:
+        log_writer.submit(row)
+
+class LogWriter:
+    """bounded queue + 백그라운드 쓰레드로 Log 행을 batch insert"""
+
+    DELAY_WARN_SEC = 2.0    # 이보다 늦게 저장된 항목은 delayed 로 집계
+
+    def __init__(self, maxsize=10000, batch_size=200, flush_interval=0.5):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.stats = {"queued": 0, "written": 0, "dropped": 0,
+                      "delayed": 0, "max_delay_sec": 0.0, "batches": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _ensure_started(self):
+        # fork 된 워커에서는 쓰레드가 따라오지 않으므로 pid 로 확인
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.monotonic(), row))
+            self._count("queued")
+        except queue.Full:
+            self._count("dropped")
+            print(f"[log] 큐가 가득 차 로그를 버립니다: {row}")
+
+    def _take_batch(self, block):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self._flush_interval) if block
+                         else self._queue.get_nowait())
+            while len(batch) < self._batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        try:
+            with SessionLocal() as db:
+                db.execute(insert(Log), [row for _, row in batch])
+                db.commit()
+        except Exception:
+            traceback.print_exc()
+            self._count("dropped", len(batch))
+            return
+        now = time.monotonic()
+        delay = now - batch[0][0]
+        with self._lock:
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["delayed"] += sum(
+                1 for t, _ in batch if now - t > self.DELAY_WARN_SEC)
+            self.stats["max_delay_sec"] = max(self.stats["max_delay_sec"], delay)
+
+    def _run(self):
+        while True:
+            batch = self._take_batch(block=True)
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """큐에 남은 항목을 현재 쓰레드에서 모두 저장 (종료 시)"""
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+log_writer = LogWriter()
+atexit.register(log_writer.flush)
 
 def get_settings():
-    with SessionLocal() as db:
-        s = db.query(Setting).filter_by(id=1).first()
-        if not s:
-            s = Setting(id=1)
-            db.add(s)
-            db.commit()
-            db.refresh(s)
-        return s
+    """설정 스냅샷 (캐시)"""
+    return settings_cache.get()
 
 def update_settings(form):
     with SessionLocal() as db:
@@ -192,44 +681,1170 @@ def update_settings(form):
         s.total_tables      = int(form.get("totalTables", 23) or 23)
         s.min_items_per_two = int(form.get("minItemsPerTwo", 1) or 1)
         s.require_main      = (form.get("requireMain") == "on")
+        ensure_table_rows(db, s.total_tables)
+        emit_event(db, "SETTINGS_UPDATED")
         db.commit()
+    project_now()
+    settings_cache.bump()
+    table_board.bump()
+    time_warnings.reseed()
 
 # ─────────────────────────────────────────────────────────
-# 6) 50/60분 경과 체크 쓰레드
+# 5-1) 재고 엔진
+#      세트 구성표(menu_components)로 주문 전체의 차감 벡터를 만든 뒤
+#      menu.id 오름차순으로 `stock = stock - n` 단일 UPDATE 를 실행한다.
+#      (행 잠금 순서가 항상 같아 동시 확정 간 교착이 생기지 않음)
 # ─────────────────────────────────────────────────────────
-_started = False
-def start_time_checker():
-    global _started
-    if _started:
+LEGACY_SET_COMPONENTS = ("포크 앙 투움바 (Pork en Toowoomba)", "떡 롤레 (Tteok Roulé)")
+
+class StockShortage(Exception):
+    """STOCK_STRICT 일 때 재고가 모자란 메뉴 id 목록"""
+    def __init__(self, menu_ids):
+        super().__init__(f"재고 부족: {menu_ids}")
+        self.menu_ids = menu_ids
+
+def stock_decrements(db, items):
+    """[(menu_id, 수량)] → {menu_id: 차감 수량} (세트 구성품 포함)"""
+    ordered = {}
+    for menu_id, qty in items:
+        ordered[menu_id] = ordered.get(menu_id, 0) + qty
+    totals = dict(ordered)
+    for c in db.query(MenuComponent).filter(MenuComponent.set_menu_id.in_(list(ordered))):
+        totals[c.component_menu_id] = (totals.get(c.component_menu_id, 0)
+                                       + ordered[c.set_menu_id] * c.quantity)
+    return totals
+
+def apply_stock_decrements(db, decrements, strict=None):
+    """차감 벡터 반영. strict 면 재고가 모자란 행은 건드리지 않고 StockShortage"""
+    strict = STOCK_STRICT if strict is None else strict
+    short = []
+    for menu_id in sorted(decrements):
+        n = decrements[menu_id]
+        stmt = update(Menu).where(Menu.id == menu_id).values(stock=Menu.stock - n)
+        if strict:
+            stmt = stmt.where(Menu.stock >= n)
+        if db.execute(stmt).rowcount == 0:
+            short.append(menu_id)
+        else:
+            emit_event(db, "STOCK_ADJUSTED", menu_id=menu_id, quantity=-n)
+    if short:
+        raise StockShortage(short)
+
+def seed_legacy_components(db):
+    """
+    구성표가 없는 세트 메뉴에, 예전에 코드에 박혀 있던 구성품
+    (LEGACY_SET_COMPONENTS) 이 메뉴에 있으면 1개씩 등록한다.
+    """
+    legacy = db.query(Menu.id).filter(Menu.name.in_(LEGACY_SET_COMPONENTS)).all()
+    if not legacy:
         return
-    _started = True
+    has_bom = {sid for (sid,) in db.query(MenuComponent.set_menu_id).distinct()}
+    for (set_id,) in db.query(Menu.id).filter(Menu.category == "set"):
+        if set_id not in has_bom:
+            db.add_all(MenuComponent(set_menu_id=set_id, component_menu_id=cid, quantity=1)
+                       for (cid,) in legacy)
+
+def menu_names(menu_ids):
+    names = {m.id: m.name for m in menu_cache.get()}
+    return ", ".join(names.get(i, str(i)) for i in menu_ids)
 
-    def runner():
+# ─────────────────────────────────────────────────────────
+# 5-2) 주방 미조리 수량 집계 (kitchen_backlog)
+#      paid 주문 항목의 (quantity - doneQuantity) 합계를 메뉴별로 유지한다.
+#      KitchenBacklogProjection 이 order_events 를 접어 갱신한다 (5-3-1).
+# ─────────────────────────────────────────────────────────
+def adjust_backlog(db, deltas):
+    """{menu_id: 증감} 반영. 잠금 순서를 맞추기 위해 menu_id 순으로 갱신"""
+    for menu_id in sorted(deltas):
+        delta = deltas[menu_id]
+        if not delta:
+            continue
+        res = db.execute(
+            update(KitchenBacklog)
+            .where(KitchenBacklog.menu_id == menu_id)
+            .values(outstanding=KitchenBacklog.outstanding + delta)
+        )
+        if res.rowcount == 0:
+            db.add(KitchenBacklog(menu_id=menu_id, outstanding=delta))
+            db.flush()
+
+def rebuild_kitchen_backlog(db):
+    """order_items 로부터 집계를 다시 계산 (커밋은 호출자가)"""
+    left = OrderItem.quantity - func.coalesce(OrderItem.doneQuantity, 0)
+    totals = dict(
+        db.query(OrderItem.menu_id, func.sum(left))
+          .join(Order, Order.id == OrderItem.order_id)
+          .filter(Order.businessDay == business_day(),
+                  Order.status == "paid", left > 0)
+          .group_by(OrderItem.menu_id)
+    )
+    db.query(KitchenBacklog).delete()
+    db.add_all(KitchenBacklog(menu_id=menu_id, outstanding=int(totals.get(menu_id, 0)))
+               for (menu_id,) in db.query(Menu.id))
+    return totals
+
+# ─────────────────────────────────────────────────────────
+# 5-2-1) 매출 원장 (sales_ledger)
+#        입금확인 이벤트(ITEM_CONFIRMED)로 메뉴 × 10분 구간 누계를 더하고,
+#        환불 등으로 되돌릴 때는 reverse_sales() 가 SALE_REVERSED 를 남긴다.
+#        매출 화면은 orders 를 훑지 않고 이 표만 읽는다.
+# ─────────────────────────────────────────────────────────
+SALES_BUCKET_MIN = 10
+
+def sales_bucket(hhmmss):
+    """HHMMSS → 10분 구간 시작 HHMM"""
+    hh, mm = hhmmss // 10000, hhmmss // 100 % 100
+    return hh * 100 + mm // SALES_BUCKET_MIN * SALES_BUCKET_MIN
+
+def _add_sales(db, day, bucket, menu_id, quantity, amount):
+    key = (SalesLedger.businessDay == day, SalesLedger.bucket == bucket,
+           SalesLedger.menu_id == menu_id)
+    inc = {"quantity": SalesLedger.quantity + quantity,
+           "amount": SalesLedger.amount + amount}
+    if db.execute(update(SalesLedger).where(*key).values(**inc)).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.add(SalesLedger(businessDay=day, bucket=bucket, menu_id=menu_id,
+                               quantity=quantity, amount=amount))
+    except IntegrityError:
+        # 같은 구간의 첫 행을 다른 요청이 먼저 만들었다
+        db.execute(update(SalesLedger).where(*key).values(**inc))
+
+def reverse_sales(db, o):
+    """
+    환불/취소 경로용: 입금확인 때 원장에 더한 값을 되돌리는 SALE_REVERSED 를 남긴다.
+    구간은 입금확인 시각 기준이라 원래 더해진 자리에서 빠진다. 커밋은 호출자가
+    """
+    if o.service:
+        return
+    price = {m.id: m.price for m in menu_cache.get()}
+    stamp = (o.confirmedAt, int(time.time()), o.businessDay)
+    for it in o.items:
+        emit_event(db, "SALE_REVERSED", order=o, stamp=stamp, item_id=it.id,
+                   menu_id=it.menu_id, quantity=it.quantity,
+                   amount=price[it.menu_id] * it.quantity)
+
+def rebuild_sales_ledger(db, day=None):
+    """
+    주문(보관 테이블 포함)으로 원장을 다시 계산. day 가 없으면 전체.
+    Session / Connection 어느 쪽이든 받는다. 커밋은 호출자가.
+    """
+    totals = {}
+    for orders, items in [(Order.__table__, OrderItem.__table__),
+                          (orders_archive, order_items_archive)]:
+        q = (select(orders.c.businessDay, orders.c.confirmedAt, items.c.menu_id,
+                    items.c.quantity, Menu.price)
+             .join(items, items.c.order_id == orders.c.id)
+             .join(Menu.__table__, Menu.id == items.c.menu_id)
+             .where(orders.c.status.in_(["paid", "completed"]),
+                    or_(orders.c.service == False, orders.c.service == None),
+                    orders.c.confirmedAt != None))
+        if day:
+            q = q.where(orders.c.businessDay == day)
+        for bday, confirmed, menu_id, quantity, price in db.execute(q):
+            key = (bday, sales_bucket(confirmed), menu_id)
+            tq, ta = totals.get(key, (0, 0))
+            totals[key] = (tq + quantity, ta + price * quantity)
+
+    wipe = delete(SalesLedger)
+    if day:
+        wipe = wipe.where(SalesLedger.businessDay == day)
+    db.execute(wipe)
+    rows = [{"businessDay": d, "bucket": b, "menu_id": m, "quantity": q, "amount": a}
+            for (d, b, m), (q, a) in totals.items()]
+    if rows:
+        db.execute(insert(SalesLedger), rows)
+    return len(rows)
+
+def business_hour_order(hour):
+    """영업일 기준 시각 정렬 키 (마감 시각 이후가 먼저)"""
+    return (hour - BUSINESS_DAY_CUTOFF_HOUR) % 24
+
+def sales_report(db, day):
+    """영업일 매출: 합계, 시간대별(10분 구간 포함), 메뉴별"""
+    rows = (db.query(SalesLedger.bucket, SalesLedger.menu_id,
+                     SalesLedger.quantity, SalesLedger.amount)
+              .filter(SalesLedger.businessDay == day)
+              .all())
+    names = {m.id: m.name for m in menu_cache.get()}
+
+    hours, menus = {}, {}
+    for bucket, menu_id, quantity, amount in rows:
+        h = hours.setdefault(bucket // 100, {"hour": bucket // 100, "amount": 0,
+                                             "quantity": 0, "buckets": {}})
+        h["amount"] += amount
+        h["quantity"] += quantity
+        h["buckets"][bucket] = h["buckets"].get(bucket, 0) + amount
+        m = menus.setdefault(menu_id, {"menu_id": menu_id,
+                                       "name": names.get(menu_id, f"#{menu_id}"),
+                                       "quantity": 0, "amount": 0})
+        m["quantity"] += quantity
+        m["amount"] += amount
+
+    hourly = sorted(hours.values(), key=lambda h: business_hour_order(h["hour"]))
+    for h in hourly:
+        h["buckets"] = sorted(h["buckets"].items())
+    return {
+        "day": day,
+        "total": sum(h["amount"] for h in hourly),
+        "hourly": hourly,
+        "by_menu": sorted(menus.values(), key=lambda m: -m["amount"]),
+    }
+
+# ─────────────────────────────────────────────────────────
+# 5-3) 메뉴/설정 캐시
+#      메뉴·설정은 관리자 쓰기 경로에서만 바뀌므로, 불변 스냅샷을
+#      버전 카운터와 함께 보관하고 쓰기 경로에서 bump() 로 무효화한다.
+# ─────────────────────────────────────────────────────────
+MenuRow = namedtuple("MenuRow", "id name price category stock sold_out")
+SettingsRow = namedtuple(
+    "SettingsRow",
+    "time_warning1 time_warning2 total_tables min_items_per_two require_main"
+)
+
+class VersionedCache:
+    """version 이 바뀐 뒤 처음 get() 할 때만 loader 를 다시 호출하는 캐시"""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_version = -1
+        self.version = 0
+
+    def get(self):
+        if self._loaded_version == self.version:
+            return self._value
+        with self._lock:
+            if self._loaded_version != self.version:
+                version = self.version          # 로딩 중 bump 되면 다음 get 에서 재로딩
+                self._value = self._loader()
+                self._loaded_version = version
+            return self._value
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+
+def _load_menu():
+    with SessionLocal() as db:
+        return tuple(
+            MenuRow(m.id, m.name, m.price, m.category, m.stock, bool(m.sold_out))
+            for m in db.query(Menu).order_by(Menu.id)
+        )
+
+def _load_settings():
+    with SessionLocal() as db:
+        s = db.query(Setting).filter_by(id=1).first()
+        if not s:
+            s = Setting(id=1, time_warning1=50, time_warning2=60,
+                        total_tables=23, min_items_per_two=1, require_main=True)
+            db.add(s)
+            db.commit()
+        return SettingsRow(s.time_warning1, s.time_warning2, s.total_tables,
+                           s.min_items_per_two, bool(s.require_main))
+
+menu_cache     = VersionedCache(_load_menu)
+settings_cache = VersionedCache(_load_settings)
+
+# ── 테이블 현황판 ──
+# table_state 행은 시작 시(및 테이블 수 변경 시) 미리 만들어 두고,
+# 조회는 메모리에서, 변경은 TableBoardProjection 반영 → 커밋 → table_board.bump() 순서로 한다.
+TableRow = namedtuple("TableRow", "tableNumber usageStart usageStartTs blocked")
+
+def table_numbers(total_tables):
+    return ["TAKEOUT"] + [str(i) for i in range(1, total_tables + 1)]
+
+def ensure_table_rows(db, total_tables):
+    """TAKEOUT, 1..total_tables 중 없는 table_state 행 생성 (커밋은 호출자가)"""
+    existing = {t for (t,) in db.query(TableState.tableNumber)}
+    db.add_all(TableState(tableNumber=t, blocked=False)
+               for t in table_numbers(total_tables) if t not in existing)
+
+def _load_tables():
+    with SessionLocal() as db:
+        return {ts.tableNumber: TableRow(ts.tableNumber, ts.usageStart,
+                                         ts.usageStartTs, bool(ts.blocked))
+                for ts in db.query(TableState)}
+
+table_board = VersionedCache(_load_tables)
+
+# ─────────────────────────────────────────────────────────
+# 5-3-1) 주문 이벤트 로그 (order_events) 와 projection
+#        변경 경로는 상태를 바꾸는 트랜잭션 안에서 emit_event() 로 이벤트를 남기고,
+#        주방 미조리 집계 / 테이블 현황판 / 매출 원장은 이벤트를 id(offset) 순으로
+#        접어서 만든다. projection 마다 checkpoint 에 반영한 마지막 id 를 두고
+#          - 변경 요청은 커밋 직후 project_now() 로 바로 따라잡고
+#          - 백그라운드 projector 가 놓친 것(빈 id 대기 등)을 주기적으로 반영하며
+#          - rebuild-projections 명령은 표를 비우고 처음부터 batch 로 다시 접는다.
+# ─────────────────────────────────────────────────────────
+EVENT_TYPES = (
+    "ORDER_CREATED", "ORDER_CONFIRMED", "ORDER_REJECTED", "ORDER_COMPLETED",
+    "ITEM_CONFIRMED",   # 입금확인된 항목 (quantity, amount=정가×수량)
+    "SERVICE_ADDED",    # 0원 서비스 항목
+    "ITEM_DONE",        # 조리 완료 배분 (quantity=이번에 늘어난 수량)
+    "ITEM_DELIVERED",
+    "ITEM_CANCELLED",   # 조리되지 않은 채 완료 처리된 수량
+    "SALE_REVERSED",    # 매출 되돌림 (quantity, amount 는 양수)
+    "STOCK_ADJUSTED",   # 재고 증감 (quantity=증감)
+    "STOCK_SET", "SOLDOUT_SET",
+    "TABLE_EMPTIED", "TABLE_BLOCKED",
+    "SETTINGS_UPDATED",
+)
+
+def emit_event(db, type, order=None, stamp=None, **cols):
+    """
+    호출자의 트랜잭션에 OrderEvent 를 추가한다 (커밋은 호출자가).
+    order 를 넘기면 주문 pk / 테이블 / 영업일을 채운다.
+    """
+    hhmmss, epoch, day = stamp or now_stamp()
+    row = {"type": type, "ts": epoch, "time": hhmmss, "businessDay": day,
+           "role": session.get("role", "customer") if has_request_context() else "system"}
+    if order is not None:
+        row.update(order_id=order.id, tableNumber=order.tableNumber,
+                   businessDay=order.businessDay or day)
+    row.update(cols)
+    db.add(OrderEvent(**row))
+
+EVENT_COLUMNS = (OrderEvent.id, OrderEvent.type, OrderEvent.ts, OrderEvent.time,
+                 OrderEvent.businessDay, OrderEvent.menu_id, OrderEvent.tableNumber,
+                 OrderEvent.quantity, OrderEvent.amount)
+
+class KitchenBacklogProjection:
+    """
+    paid 항목의 미조리 수량 (kitchen_backlog). 현재 영업일 이벤트만 센다
+    (allocate_done / 관리자 화면과 같은 기준). 영업일이 바뀌면 project_events 가
+    reset 해서 오늘 이벤트부터 다시 접는다.
+    """
+
+    name = "kitchen_backlog"
+    daily = True            # 영업일이 바뀌면 reset
+    topic = "kitchen"
+    SIGN = {"ITEM_CONFIRMED": 1, "SERVICE_ADDED": 1, "ITEM_DONE": -1, "ITEM_CANCELLED": -1}
+
+    def reset(self, db):
+        db.query(KitchenBacklog).delete()
+        db.add_all(KitchenBacklog(menu_id=menu_id, outstanding=0)
+                   for (menu_id,) in db.query(Menu.id))
+        db.flush()
+        # 현재 영업일 주문만 센다 (rebuild_kitchen_backlog 와 같은 기준)
+        first = (db.query(func.min(OrderEvent.id))
+                   .filter(OrderEvent.businessDay == business_day()).scalar())
+        if first is None:
+            return db.query(func.coalesce(func.max(OrderEvent.id), 0)).scalar()
+        return first - 1
+
+    def apply(self, db, events, replay=False):
+        today = business_day()
+        deltas = {}
+        for ev in events:
+            sign = self.SIGN.get(ev.type)
+            if sign and ev.businessDay == today:
+                deltas[ev.menu_id] = deltas.get(ev.menu_id, 0) + sign * ev.quantity
+        adjust_backlog(db, deltas)
+        return {"kitchen"} if any(deltas.values()) else set()
+
+class TableBoardProjection:
+    """
+    테이블 사용 시작 시각 / 차단 여부 (table_state).
+    blocked 는 토글이 직전 값을 잠그고 읽어야 하므로 변경 트랜잭션에서 바로 쓰고,
+    TABLE_BLOCKED 는 재생(rebuild) 때만 반영한다.
+    """
+
+    name = "table_board"
+    daily = False
+    TYPES = ("ORDER_CONFIRMED", "TABLE_EMPTIED", "TABLE_BLOCKED")
+
+    def reset(self, db):
+        db.execute(update(TableState).values(usageStart=None, usageStartTs=None,
+                                             blocked=False))
+        return 0
+
+    def apply(self, db, events, replay=False):
+        types = self.TYPES if replay else self.TYPES[:2]
+        events = [ev for ev in events if ev.type in types and ev.tableNumber]
+        if not events:
+            return set()
+        rows = {}
+        for t, start, start_ts, blocked in (
+                db.query(TableState.tableNumber, TableState.usageStart,
+                         TableState.usageStartTs, TableState.blocked)
+                  .filter(TableState.tableNumber.in_({ev.tableNumber for ev in events}))):
+            rows[t] = {"tableNumber": t, "usageStart": start, "usageStartTs": start_ts}
+            if replay:
+                rows[t]["blocked"] = bool(blocked)
+        before = {t: dict(r) for t, r in rows.items()}
+        for ev in events:
+            r = rows.get(ev.tableNumber)
+            if r is None:           # 테이블 수를 줄여 행이 없어진 경우
+                continue
+            if ev.type == "ORDER_CONFIRMED":
+                if ev.quantity and r["usageStart"] is None:
+                    r["usageStart"], r["usageStartTs"] = ev.time, ev.ts
+            elif ev.type == "TABLE_EMPTIED":
+                r["usageStart"] = r["usageStartTs"] = None
+            else:
+                r["blocked"] = bool(ev.quantity)
+        changed = [r for t, r in sorted(rows.items()) if r != before[t]]
+        if changed:
+            db.execute(update(TableState), changed)     # tableNumber 기준 bulk UPDATE
+        return {"table"} if changed else set()
+
+class SalesLedgerProjection:
+    """영업일 × 10분 구간 × 메뉴 매출 (sales_ledger)"""
+
+    name = "sales_ledger"
+    daily = False
+    SIGN = {"ITEM_CONFIRMED": 1, "SALE_REVERSED": -1}
+
+    def reset(self, db):
+        # 이벤트가 있는 영업일만 비운다. 그 이전 영업일은 rebuild-sales-ledger 로
+        db.execute(delete(SalesLedger).where(SalesLedger.businessDay.in_(
+            select(OrderEvent.businessDay).distinct())))
+        return 0
+
+    def apply(self, db, events, replay=False):
+        totals = {}
+        for ev in events:
+            sign = self.SIGN.get(ev.type)
+            if not sign:
+                continue
+            key = (ev.businessDay, sales_bucket(ev.time), ev.menu_id)
+            q, a = totals.get(key, (0, 0))
+            totals[key] = (q + sign * ev.quantity, a + sign * (ev.amount or 0))
+        for (day, bucket, menu_id), (q, a) in sorted(totals.items()):   # 잠금 순서 고정
+            _add_sales(db, day, bucket, menu_id, q, a)
+        return set()
+
+PROJECTIONS = (KitchenBacklogProjection(), TableBoardProjection(), SalesLedgerProjection())
+PROJECTION_BATCH = 2000
+
+def ensure_checkpoints(db):
+    """없는 projection checkpoint 행을 0 으로 만든다 (커밋은 호출자가)"""
+    existing = {n for (n,) in db.query(ProjectionCheckpoint.name)}
+    db.add_all(ProjectionCheckpoint(name=p.name, lastEventId=0, updatedAt=0)
+               for p in PROJECTIONS if p.name not in existing)
+    db.flush()
+
+def _lock_checkpoints(db, names):
+    return {cp.name: cp for cp in (db.query(ProjectionCheckpoint)
+                                     .filter(ProjectionCheckpoint.name.in_(names))
+                                     .order_by(ProjectionCheckpoint.name)
+                                     .with_for_update())}
+
+def _contiguous(rows, last_id, now):
+    """
+    id 가 비는 곳에서 멈춘다 (아직 커밋되지 않은 트랜잭션의 이벤트일 수 있으므로).
+    빈 곳 뒤 이벤트가 PROJECTION_GAP_SEC 보다 오래됐으면 롤백된 id 로 보고 넘어간다.
+    """
+    out = []
+    for ev in rows:
+        if ev.id != last_id + 1 and ev.ts > now - PROJECTION_GAP_SEC:
+            break
+        out.append(ev)
+        last_id = ev.id
+    return out
+
+def _advance(db, projections, checkpoints, replay=False):
+    """checkpoint 이후 이벤트를 batch 로 읽어 반영. (반영한 이벤트 수, 바뀐 topic) 반환"""
+    now = int(time.time())
+    applied, topics = 0, set()
+    while True:
+        start = min(checkpoints[p.name].lastEventId for p in projections)
+        rows = db.execute(select(*EVENT_COLUMNS)
+                          .where(OrderEvent.id > start)
+                          .order_by(OrderEvent.id)
+                          .limit(PROJECTION_BATCH)).all()
+        events = _contiguous(rows, start, now)
+        for p in projections:
+            cp = checkpoints[p.name]
+            mine = [ev for ev in events if ev.id > cp.lastEventId]
+            if mine:
+                topics |= p.apply(db, mine, replay)
+                cp.lastEventId = mine[-1].id
+                cp.updatedAt = now
+        applied += len(events)
+        if len(events) < PROJECTION_BATCH:
+            return applied, topics
+
+def project_events(db, names=None):
+    """
+    checkpoint 행을 이름 순으로 잠그고 그 뒤 이벤트를 반영한다 (커밋은 호출자가).
+    여러 worker 가 동시에 불러도 같은 이벤트가 두 번 반영되지 않는다.
+    """
+    checkpoints = _lock_checkpoints(db, [p.name for p in PROJECTIONS
+                                         if names is None or p.name in names])
+    projections = [p for p in PROJECTIONS if p.name in checkpoints]
+    if not projections:
+        return 0, set()
+    rolled = _roll_over(db, projections, checkpoints)
+    applied, topics = _advance(db, projections, checkpoints)
+    return applied, topics | rolled
+
+def _roll_over(db, projections, checkpoints):
+    """마지막 반영이 지난 영업일이었던 daily projection 은 비우고 오늘부터 다시 접는다"""
+    today, now, topics = business_day(), int(time.time()), set()
+    for p in projections:
+        cp = checkpoints[p.name]
+        if p.daily and business_day(datetime.datetime.fromtimestamp(cp.updatedAt, KST)) != today:
+            cp.lastEventId = p.reset(db)
+            cp.updatedAt = now
+            topics.add(p.topic)
+    return topics
+
+def rebuild_projection(db, name):
+    """표를 비우고 이벤트를 처음부터 batch 로 다시 반영 (커밋은 호출자가). 반영 건수 반환"""
+    p = next(p for p in PROJECTIONS if p.name == name)
+    ensure_checkpoints(db)
+    checkpoints = _lock_checkpoints(db, [name])
+    checkpoints[name].lastEventId = p.reset(db)
+    return _advance(db, [p], checkpoints, replay=True)[0]
+
+def mark_projected(db, name):
+    """
+    이벤트가 아닌 원본 표(orders)로 projection 을 다시 계산한 뒤 호출:
+    지금까지의 이벤트는 이미 반영된 것으로 표시한다 (커밋은 호출자가).
+    """
+    ensure_checkpoints(db)
+    cp = _lock_checkpoints(db, [name])[name]
+    cp.lastEventId = db.query(func.coalesce(func.max(OrderEvent.id), 0)).scalar()
+    cp.updatedAt = int(time.time())
+
+def _project_commit():
+    """
+    project_events 를 커밋하고 바뀐 topic 에 맞는 이 worker 의 캐시를 무효화한다.
+    다른 worker 는 이벤트 버스로 받지만 자기 origin 메시지는 무시하므로
+    project_now / projector 모두 여기서 직접 bump 한다. (반영 수, topic) 반환
+    """
+    with SessionLocal() as db:
+        applied, topics = project_events(db)
+        db.commit()
+    for topic in topics:
+        for cache in EventBus.INVALIDATES.get(topic, lambda: ())():
+            cache.bump()
+    return applied, topics
+
+def project_now():
+    """변경 요청 커밋 직후 호출: 이 프로세스 캐시까지 바로 맞춘다 (실패해도 projector 가 재시도)"""
+    try:
+        return _project_commit()[1]
+    except Exception:
+        traceback.print_exc()
+        return set()
+
+class Projector:
+    """
+    worker 마다 하나: 새 이벤트가 있거나 영업일이 바뀌면 project_events() 로 반영하고,
+    다른 worker 캐시/SSE 구독자를 위해 바뀐 topic 을 publish 한다.
+    """
+
+    def __init__(self, poll_sec):
+        self._poll_sec = poll_sec
+        self._started_pid = None
+        self._day = None
+
+    def start(self):
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
         while True:
-            time.sleep(60)
             try:
-                with SessionLocal() as db:
-                    s   = db.query(Setting).filter_by(id=1).first()
-                    now = hhmmss_to_minutes(current_hhmmss())
-                    for o in db.query(Order).filter(
-                        Order.status=="paid", Order.confirmedAt!=None
-                    ).all():
-                        diff = now - hhmmss_to_minutes(f"{o.confirmedAt:06d}")
-                        if o.alertTime1==0 and diff>=s.time_warning1:
-                            o.alertTime1 = 1
-                            db.add(Log(time=int(current_hhmmss()),
-                                       role="system", action="TIME_WARNING1",
-                                       detail=f"id={o.order_id}"))
-                        if o.alertTime2==0 and diff>=s.time_warning2:
-                            o.alertTime2 = 1
-                            db.add(Log(time=int(current_hhmmss()),
-                                       role="system", action="TIME_WARNING2",
-                                       detail=f"id={o.order_id}"))
-                    db.commit()
+                self.run_once()
             except Exception:
                 traceback.print_exc()
+            time.sleep(self._poll_sec)
+
+    def run_once(self):
+        with engine.connect() as conn:
+            head = conn.execute(select(func.max(OrderEvent.id))).scalar()
+            done = conn.execute(select(func.min(ProjectionCheckpoint.lastEventId))).scalar()
+        today = business_day()
+        behind = head is not None and done is not None and done < head
+        if not behind and today == self._day:
+            return
+        t0 = time.perf_counter()
+        applied, topics = _project_commit()
+        self._day = today
+        if applied:
+            metrics.inc("order_events_projected_total", applied)
+            metrics.observe("scheduler_run_seconds", time.perf_counter() - t0,
+                            job="projector")
+        for topic in sorted(topics):
+            publish_event(topic, action="projected")
+
+projector = Projector(PROJECTION_POLL_SEC)
+metrics.describe("order_events_projected_total", "counter", "백그라운드 projector 가 반영한 이벤트 수")
+
+# ─────────────────────────────────────────────────────────
+# 5-4) 실시간 이벤트 (Server-Sent Events)
+#      변경 경로에서 publish_event() → /events 구독자에게 전달
+#      topic: order, kitchen, stock, table, settings
+# ─────────────────────────────────────────────────────────
+SSE_KEEPALIVE_SEC = 15
+
+class EventBroker:
+    """구독자마다 bounded queue 를 두는 프로세스 내 fan-out"""
+
+    def __init__(self, maxsize=100):
+        self._maxsize = maxsize
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self._maxsize)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, topic, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((topic, data))
+            except queue.Full:
+                pass    # 느린 구독자: 다음 이벤트 때 어차피 화면 전체를 다시 받는다
 
-    threading.Thread(target=runner, daemon=True).start()
+broker = EventBroker()
+
+def publish_event(topic, **data):
+    event_bus.publish(topic, data)
+
+# ─────────────────────────────────────────────────────────
+# 5-4-1) worker 간 이벤트 버스
+#        publish 한 프로세스는 곧바로 자기 SSE 구독자에게 전달하고
+#        (캐시는 변경 경로에서 이미 bump 했다), backend 를 통해 받은
+#        다른 worker 는 topic 에 맞는 캐시를 무효화한 뒤 전달한다.
+# ─────────────────────────────────────────────────────────
+metrics.describe("event_bus_messages_total", "counter", "이벤트 버스 송수신 수")
+
+class LocalBackend:
+    """
+    프로세스 내 backend. 같은 인스턴스를 여러 EventBus 에 넘기면
+    여러 worker 를 흉내 낼 수 있다 (테스트용 fake).
+    """
+
+    def __init__(self):
+        self._callbacks = []
+
+    def start(self, callback):
+        self._callbacks.append(callback)
+
+    def send(self, raw):
+        for cb in list(self._callbacks):
+            cb(raw)
+
+class DbPollBackend:
+    """
+    event_outbox 에 INSERT, 각 worker 는 마지막으로 본 id 이후를 폴링.
+    projection 과 같이 빈 id 에서 멈춘다 (_contiguous): 작은 id 가 나중에 커밋돼도
+    건너뛰지 않고, PROJECTION_GAP_SEC 가 지나도 안 채워지면 롤백된 id 로 본다.
+    """
+
+    RETAIN_SEC = 600
+    PRUNE_SEC  = 60
+
+    def __init__(self, poll_sec):
+        self._poll_sec = poll_sec
+
+    def send(self, raw):
+        with engine.begin() as conn:
+            conn.execute(insert(EventOutbox).values(ts=int(time.time()), payload=raw))
+
+    def start(self, callback):
+        threading.Thread(target=self._run, args=(callback,), daemon=True).start()
+
+    def _fetch(self, conn, last_id):
+        """last_id 뒤로 빈 id 없이 이어지는 (id, ts, payload) 행들"""
+        rows = conn.execute(select(EventOutbox.id, EventOutbox.ts, EventOutbox.payload)
+                            .where(EventOutbox.id > last_id)
+                            .order_by(EventOutbox.id)).all()
+        return _contiguous(rows, last_id, int(time.time()))
+
+    def _run(self, callback):
+        last_id = None          # 시작 시점의 마지막 id (DB 가 준비될 때까지 재시도)
+        next_prune = 0
+        while True:
+            try:
+                with engine.connect() as conn:
+                    if last_id is None:
+                        last_id = conn.execute(
+                            select(func.coalesce(func.max(EventOutbox.id), 0))).scalar()
+                    rows = self._fetch(conn, last_id)
+                    if time.time() >= next_prune:
+                        conn.execute(delete(EventOutbox).where(
+                            EventOutbox.ts < int(time.time()) - self.RETAIN_SEC))
+                        conn.commit()
+                        next_prune = time.time() + self.PRUNE_SEC
+                for row_id, _, raw in rows:
+                    last_id = row_id
+                    callback(raw)
+            except Exception:
+                traceback.print_exc()
+            time.sleep(self._poll_sec)
+
+class RedisBackend:
+    """Redis pub/sub. 연결이 끊기면 잠시 뒤 다시 구독한다"""
+
+    CHANNEL = "aif:events"
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("EVENT_BUS 가 redis 인데 redis 패키지가 없습니다 (pip install redis)")
+        self._client = redis.Redis.from_url(url)
+
+    def send(self, raw):
+        self._client.publish(self.CHANNEL, raw)
+
+    def start(self, callback):
+        threading.Thread(target=self._run, args=(callback,), daemon=True).start()
+
+    def _run(self, callback):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for msg in pubsub.listen():
+                    callback(msg["data"].decode("utf-8"))
+            except Exception:
+                traceback.print_exc()
+                time.sleep(1)
+
+def make_event_backend(spec):
+    if spec == "local":
+        return LocalBackend()
+    if spec == "db":
+        return DbPollBackend(EVENT_POLL_SEC)
+    if spec.startswith(("redis://", "rediss://")):
+        return RedisBackend(spec)
+    raise ValueError(f"알 수 없는 EVENT_BUS: {spec}")
+
+class EventBus:
+    # 다른 worker 에서 온 topic → 무효화할 캐시
+    INVALIDATES = {
+        "stock":    lambda: (menu_cache,),
+        "settings": lambda: (settings_cache, table_board),
+        "table":    lambda: (table_board,),
+    }
+
+    def __init__(self, backend, local=None):
+        self.backend = backend
+        self.local = local or broker        # 이 프로세스의 SSE fan-out
+        self.origin = uuid.uuid4().hex
+        self._started_pid = None
+
+    def publish(self, topic, data):
+        self.local.publish(topic, data)
+        raw = json.dumps({"o": self.origin, "t": topic, "d": data}, ensure_ascii=False)
+        try:
+            self.backend.send(raw)
+            metrics.inc("event_bus_messages_total", direction="sent")
+        except Exception:
+            # 전달 실패는 다른 worker 의 캐시가 조금 늦게 갱신되는 정도로 끝낸다
+            traceback.print_exc()
+            metrics.inc("event_bus_messages_total", direction="send_error")
+
+    def start(self):
+        """worker 당 한 번 (fork 이후). 자기 origin 도 이때 새로 정한다"""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self.origin = uuid.uuid4().hex
+        self.backend.start(self._receive)
+
+    def _receive(self, raw):
+        msg = json.loads(raw)
+        if msg["o"] == self.origin:
+            return
+        metrics.inc("event_bus_messages_total", direction="received")
+        topic, data = msg["t"], msg["d"]
+        for cache in self.INVALIDATES.get(topic, lambda: ())():
+            cache.bump()
+        if topic == "settings":
+            time_warnings.reseed()
+        elif topic == "order" and data.get("action") in ("confirmed", "service"):
+            if data.get("action") == "confirmed":
+                table_board.bump()      # 테이블 사용 시작
+            if data.get("ts"):
+                time_warnings.schedule(data["id"], data["ts"])
+        self.local.publish(topic, data)
+
+event_bus = EventBus(make_event_backend(EVENT_BUS))
+
+# ─────────────────────────────────────────────────────────
+# 5-5) 관리자 대시보드 스냅샷
+#      주문 수와 무관하게 고정된 개수의 쿼리로 모든 섹션을 만든다.
+#      (설정 1 + 메뉴 1 + 세트 구성표 1 + 진행 주문 1 + 항목 1
+#       + 완료 첫 페이지 1 + 거절 첫 페이지 1 + 최근 최초주문 1 + 매출 1 = 최대 9,
+#       테이블 현황은 table_board 에서 읽는다)
+#      SSE 갱신 때는 바뀐 조각(parts)만 만든다 → /admin?part=<이름>
+# ─────────────────────────────────────────────────────────
+ADMIN_SNAPSHOT_QUERY_BUDGET = 9
+ADMIN_PARTS = {               # 조각 이름 → 템플릿
+    "tables": "admin_tables.html",
+    "sales": "admin_sales_summary.html",
+    "orders": "admin_orders.html",
+    "closed": "admin_closed.html",
+    "menu": "admin_menu.html",
+}
+CLOSED_PAGE_SIZE = 12       # 완료/거절 주문은 한 번에 이만큼만 그리고 나머지는 "더 보기"
+
+def closed_orders_page(db, status, sort_mode="asc", after=None):
+    """
+    완료/거절 주문 한 페이지 (Order.id keyset).
+    {"orders": [...], "next_after": 다음 페이지 커서 또는 None}
+    """
+    q = db.query(Order).filter(Order.businessDay == business_day(),
+                               Order.status == status)
+    if sort_mode == "asc":
+        if after is not None:
+            q = q.filter(Order.id > after)
+        q = q.order_by(Order.id.asc())
+    else:
+        if after is not None:
+            q = q.filter(Order.id < after)
+        q = q.order_by(Order.id.desc())
+    rows = q.limit(CLOSED_PAGE_SIZE + 1).all()
+
+    orders = [{
+        "id": o.id, "order_id": o.order_id,
+        "tableNumber": o.tableNumber,
+        "totalPrice": o.totalPrice,
+        "service": o.service,
+        "phoneNumber": o.phoneNumber,
+        "createdAt": o.createdAt
+    } for o in rows[:CLOSED_PAGE_SIZE]]
+    next_after = orders[-1]["id"] if len(rows) > CLOSED_PAGE_SIZE else None
+    return {"orders": orders, "next_after": next_after}
+
+def table_color(diff, s):
+    """경과 분 → 테이블 현황 색상"""
+    if diff >= s.time_warning2:
+        return "red"
+    if diff >= s.time_warning1:
+        return "yellow"
+    return "normal"
+
+def build_admin_snapshot(db, sort_mode="asc", parts=ADMIN_PARTS):
+    """
+    admin.html 렌더링에 필요한 데이터를 dict 로 반환.
+    parts 를 주면 그 조각에 필요한 키만 채운다 (설정은 항상 포함).
+    """
+    s = db.query(Setting).filter_by(id=1).first()
+    day = business_day()
+    snapshot = {"settings": s}
+
+    if "tables" in parts:
+        snapshot["table_status_info"] = admin_table_status(s)
+    if "menu" in parts or "orders" in parts:
+        snapshot["menu_items"] = [{
+            "id": m.id, "name": m.name,
+            "price": m.price, "category": m.category,
+            "stock": m.stock, "soldOut": m.sold_out
+        } for m in db.query(Menu).order_by(Menu.id)]
+    if "orders" in parts:
+        snapshot.update(admin_active_orders(db, day, sort_mode, snapshot["menu_items"]))
+    if "closed" in parts:
+        # completed / rejected : 항목 불필요, 첫 페이지만
+        snapshot["completed_orders"] = closed_orders_page(db, "completed", sort_mode)
+        snapshot["rejected_orders"] = closed_orders_page(db, "rejected", sort_mode)
+    if "sales" in parts:
+        snapshot["current_sales"] = db.query(
+            func.coalesce(func.sum(SalesLedger.amount), 0)
+        ).filter(SalesLedger.businessDay == day).scalar()
+    return snapshot
+
+def admin_table_status(s):
+    """테이블 현황 (메모리 현황판, 쿼리 없음)"""
+    states = table_board.get()
+    table_status_info = []
+    for t in table_numbers(s.total_tables):
+        ts = states.get(t)
+        if ts and ts.usageStart is not None:
+            diff = elapsed_minutes(ts.usageStartTs, ts.usageStart)
+            table_status_info.append((t, f"{diff}분", table_color(diff, s), ts.blocked, False))
+        else:
+            table_status_info.append((t, "-", "empty", ts.blocked if ts else False, True))
+    return table_status_info
+
+def admin_active_orders(db, day, sort_mode, menu_items):
+    """pending / paid 주문 (세트 구성표 + 진행 주문 + 항목 + 최근 최초주문)"""
+    stock_of = {m["id"]: m["stock"] for m in menu_items}
+    components = {}
+    for c in db.query(MenuComponent):
+        components.setdefault(c.set_menu_id, []).append((c.component_menu_id, c.quantity))
+
+    def short_of_stock(o):
+        """확정하면 재고가 음수가 되는 주문인지"""
+        need = {}
+        for it in o.items:
+            need[it.menu_id] = need.get(it.menu_id, 0) + it.quantity
+            for cid, cq in components.get(it.menu_id, ()):
+                need[cid] = need.get(cid, 0) + it.quantity * cq
+        return any(stock_of.get(mid, 0) < n for mid, n in need.items())
+
+    order_by_clause = Order.id.asc() if sort_mode == "asc" else Order.id.desc()
+
+    # pending / paid : 항목과 메뉴를 함께 로딩
+    active = (db.query(Order)
+                .filter(Order.businessDay == day,
+                        Order.status.in_(["pending", "paid"]))
+                .options(selectinload(Order.items).joinedload(OrderItem.menu))
+                .order_by(order_by_clause)
+                .all())
+
+    # 테이블별 가장 최근 최초 주문 (pending 이 있는 테이블만, 한 번에)
+    pending_tables = {o.tableNumber for o in active if o.status == "pending"}
+    recent_first = {}
+    if pending_tables:
+        latest = (db.query(Order.tableNumber, func.max(Order.id).label("max_id"))
+                    .filter(Order.businessDay == day,
+                            Order.peopleCount > 0,
+                            Order.tableNumber.in_(pending_tables))
+                    .group_by(Order.tableNumber)
+                    .subquery())
+        recent_first = dict(
+            db.query(latest.c.tableNumber, Order.order_id)
+              .join(Order, Order.id == latest.c.max_id)
+        )
+
+    pending_orders, paid_orders = [], []
+    for o in active:
+        if o.status == "pending":
+            pending_orders.append({
+                "id": o.id, "order_id": o.order_id,
+                "tableNumber": o.tableNumber,
+                "peopleCount": o.peopleCount,
+                "phoneNumber": o.phoneNumber,
+                "totalPrice": o.totalPrice,
+                "items": [{"menuName": it.menu.name, "quantity": it.quantity}
+                          for it in o.items],
+                "is_first": o.peopleCount > 0,
+                "recent_first_time": recent_first.get(o.tableNumber, ""),
+                "stock_negative_warning": short_of_stock(o),
+                "createdAt": o.createdAt
+            })
+        else:
+            paid_orders.append({
+                "id": o.id, "order_id": o.order_id,
+                "tableNumber": o.tableNumber,
+                "totalPrice": o.totalPrice,
+                "items": [{
+                    "id": it.id,
+                    "menuName": it.menu.name,
+                    "quantity": it.quantity,
+                    "doneQuantity": it.doneQuantity,
+                    "deliveredQuantity": it.deliveredQuantity
+                } for it in o.items],
+                # 조리됐지만 아직 전달 안 된 수량
+                "ready": sum(it.doneQuantity - it.deliveredQuantity for it in o.items),
+                "service": o.service,
+                "phoneNumber": o.phoneNumber,
+                "createdAt": o.createdAt
+            })
+    return {"pending_orders": pending_orders, "paid_orders": paid_orders}
+
+# ─────────────────────────────────────────────────────────
+# 6) 50/60분 경과 알림 스케줄러
+#    다가오는 알림 시각을 min-heap 으로 들고 있다가 정확히 그 시각에 처리한다.
+#    DB 임대(lease)를 가진 프로세스 하나만 실행한다 (gunicorn 워커 여러 개 대비).
+# ─────────────────────────────────────────────────────────
+def try_acquire_lease(name, owner, ttl):
+    """만료됐거나 내가 가진 임대를 ttl 초 연장. 성공하면 True"""
+    now = int(time.time())
+    with SessionLocal() as db:
+        res = db.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == name,
+                   or_(SchedulerLease.owner == owner,
+                       SchedulerLease.expiresAt < now))
+            .values(owner=owner, expiresAt=now + ttl)
+        )
+        if res.rowcount == 1:
+            db.commit()
+            return True
+        if db.get(SchedulerLease, name) is not None:
+            db.rollback()
+            return False
+        db.add(SchedulerLease(name=name, owner=owner, expiresAt=now + ttl))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+
+class TimeWarningScheduler:
+    LEASE_NAME  = "time_warning"
+    LEASE_TTL   = 30    # 초
+    RESEED_SEC  = 60    # 다른 프로세스에서 확정된 주문을 주워오는 주기
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._heap = []             # (deadline_epoch, order_pk, level)
+        self._cond = threading.Condition()
+        self._is_leader = False
+        self._next_reseed = 0
+
+    def schedule(self, order_pk, confirmed_epoch):
+        """주문 확정 직후 호출: 두 알림 시각을 heap 에 추가"""
+        s = get_settings()
+        base = confirmed_epoch
+        with self._cond:
+            heapq.heappush(self._heap, (base + s.time_warning1 * 60, order_pk, 1))
+            heapq.heappush(self._heap, (base + s.time_warning2 * 60, order_pk, 2))
+            self._cond.notify()
+
+    def reseed(self):
+        """설정 변경 등으로 모든 시각을 다시 계산해야 할 때"""
+        with self._cond:
+            self._next_reseed = 0
+            self._cond.notify()
+
+    def _load(self):
+        s = get_settings()
+        heap = []
+        with SessionLocal() as db:
+            for pk, confirmed, confirmed_ts, a1, a2 in db.query(
+                Order.id, Order.confirmedAt, Order.confirmedTs,
+                Order.alertTime1, Order.alertTime2
+            ).filter(Order.businessDay == business_day(),
+                     Order.status == "paid", Order.confirmedAt != None,
+                     or_(Order.alertTime1 == 0, Order.alertTime2 == 0)):
+                base = confirmed_ts if confirmed_ts is not None else hhmmss_to_epoch(confirmed)
+                if a1 == 0:
+                    heap.append((base + s.time_warning1 * 60, pk, 1))
+                if a2 == 0:
+                    heap.append((base + s.time_warning2 * 60, pk, 2))
+        heapq.heapify(heap)
+        with self._cond:
+            self._heap = heap
+            self._next_reseed = time.time() + self.RESEED_SEC
+
+    def _fire(self, order_pk, level):
+        col = Order.alertTime1 if level == 1 else Order.alertTime2
+        with SessionLocal() as db:
+            res = db.execute(
+                update(Order)
+                .where(Order.id == order_pk, Order.status == "paid", col == 0)
+                .values({col: 1})
+            )
+            if res.rowcount == 1:
+                oid = db.query(Order.order_id).filter_by(id=order_pk).scalar()
+                log_action("system", f"TIME_WARNING{level}", f"id={oid}", db=db)
+            db.commit()
+
+    def run_once(self):
+        """임대 갱신 → 만기 알림 처리. 다음에 깨어날 때까지의 초를 반환"""
+        leader = try_acquire_lease(self.LEASE_NAME, self.owner, self.LEASE_TTL)
+        if leader and not self._is_leader:
+            self._next_reseed = 0       # 새로 리더가 되면 DB 기준으로 다시 시작
+        self._is_leader = leader
+        renew_in = self.LEASE_TTL / 3
+        if not leader:
+            with self._cond:
+                self._heap = []
+            return renew_in
+
+        if time.time() >= self._next_reseed:
+            self._load()
+
+        while True:
+            with self._cond:
+                if not self._heap or self._heap[0][0] > time.time():
+                    break
+                _, order_pk, level = heapq.heappop(self._heap)
+            self._fire(order_pk, level)
+
+        with self._cond:
+            wait = min(renew_in, self._next_reseed - time.time())
+            if self._heap:
+                wait = min(wait, self._heap[0][0] - time.time())
+        return max(wait, 0)
+
+    def run(self):
+        # --preload 로 master 에서 만든 객체를 worker 들이 fork 로 물려받으므로
+        # lease 소유자 이름은 실제로 도는 프로세스에서 다시 정한다
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        while True:
+            t0 = time.perf_counter()
+            try:
+                wait = self.run_once()
+            except Exception:
+                traceback.print_exc()
+                wait = 5
+            metrics.observe("scheduler_run_seconds", time.perf_counter() - t0,
+                            job="time_warning")
+            with self._cond:
+                self._cond.wait(timeout=wait)
+
+time_warnings = TimeWarningScheduler()
+
+_started = False
+def start_time_checker():
+    """프로세스당 한 번 스케줄러 쓰레드 시작 (리더는 DB lease 로 하나만)"""
+    global _started
+    if _started:
+        return
+    _started = True
+    threading.Thread(target=time_warnings.run, daemon=True).start()
+
+# ─────────────────────────────────────────────────────────
+# 6-1) 요청 / SQL / 풀 계측
+# ─────────────────────────────────────────────────────────
+@event.listens_for(engine, "before_cursor_execute")
+def _sql_start(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_t0 = time.perf_counter()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _sql_end(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_t0
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+    metrics.observe("sql_statement_duration_seconds", elapsed, verb=verb)
+    if has_request_context():
+        g.sql_count = g.get("sql_count", 0) + 1
+
+@app.before_request
+def _request_start():
+    g.request_t0 = time.perf_counter()
+    g.sql_count = 0
+
+@app.after_request
+def _request_end(response):
+    if "request_t0" in g:
+        endpoint = request.endpoint or "unknown"
+        metrics.observe("http_request_duration_seconds",
+                        time.perf_counter() - g.request_t0,
+                        endpoint=endpoint, method=request.method,
+                        status=response.status_code)
+        metrics.observe("http_request_sql_statements", g.sql_count, endpoint=endpoint)
+    return response
+
+metrics.describe("db_pool_connections", "gauge", "커넥션 풀 상태")
+metrics.gauge("db_pool_connections", lambda: [
+    ((("state", "in_use"),), engine.pool.checkedout()),
+    ((("state", "idle"),), engine.pool.checkedin()),
+    ((("state", "overflow"),), max(engine.pool.overflow(), 0)),
+])
+metrics.describe("log_writer_entries", "gauge", "감사 로그 writer 누적 건수")
+metrics.gauge("log_writer_entries", lambda: [
+    ((("state", k),), v) for k, v in log_writer.stats.items() if k != "max_delay_sec"
+] + [((("state", "queue_depth"),), log_writer._queue.qsize())])
+metrics.describe("log_writer_max_delay_seconds", "gauge", "감사 로그 최대 대기 시간")
+metrics.gauge("log_writer_max_delay_seconds",
+              lambda: [((), log_writer.stats["max_delay_sec"])])
+metrics.describe("sse_subscribers", "gauge", "연결된 SSE 구독자 수")
+metrics.gauge("sse_subscribers", lambda: [((), len(broker._subscribers))])
 
 # ─────────────────────────────────────────────────────────
 # 7) 에러핸들러
@@ -281,33 +1896,163 @@ def login_required(fn):
 def index():
     return render_template("index.html")
 
+# ─────────────────────────────────────────────────────────
+# 9-1) 주문 제출 유입 제어 (admission control)
+#      1. 프로세스 동시 처리 한도 초과 → 429 + Retry-After
+#      2. 같은 멱등 키로 이미 들어온 주문 → 새로 넣지 않고 원래 주문 결과
+#      3. 테이블별(TAKEOUT 은 전화번호별) token bucket 소진 → 429 + Retry-After
+# ─────────────────────────────────────────────────────────
+metrics.describe("order_admission_rejected_total", "counter", "유입 제어로 거절한 주문 제출 수")
+metrics.describe("order_idempotent_replays_total", "counter", "멱등 키로 원래 주문을 돌려준 수")
+
+class TokenBuckets:
+    """키(테이블 번호 등)별 token bucket. take() 는 (성공 여부, 다음 토큰까지 초)"""
+
+    MAX_KEYS = 1000     # 넘으면 가득 찬(오래 안 쓴) bucket 부터 버린다
+
+    def __init__(self, burst, refill_sec):
+        self._burst = burst
+        self._refill_sec = refill_sec
+        self._lock = threading.Lock()
+        self._buckets = {}      # key -> (tokens, 마지막 갱신 monotonic)
+
+    def _prune(self, now):
+        idle = self._burst * self._refill_sec
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < idle}
+
+    def take(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._buckets and len(self._buckets) >= self.MAX_KEYS:
+                self._prune(now)
+            tokens, last = self._buckets.get(key, (self._burst, now))
+            tokens = min(self._burst, tokens + (now - last) / self._refill_sec)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return True, 0
+            self._buckets[key] = (tokens, now)
+            return False, math.ceil((1 - tokens) * self._refill_sec)
+
+order_buckets  = TokenBuckets(ORDER_BURST, ORDER_REFILL_SEC)
+order_inflight = threading.BoundedSemaphore(ORDER_MAX_INFLIGHT)
+
+def order_busy(retry_after, reason):
+    metrics.inc("order_admission_rejected_total", reason=reason)
+    res = Response(render_template("order_busy.html", retry_after=retry_after,
+                                   reason=reason), status=429)
+    res.headers["Retry-After"] = str(retry_after)
+    return res
+
+def admission_key(form):
+    """
+    token bucket 키. 테이블은 번호, TAKEOUT 은 손님마다 다르므로 전화번호(숫자만).
+    없는 테이블 번호는 None (bucket 을 만들지 않고 order() 의 검증에 맡긴다)
+    """
+    table = form.get("tableNumber", "")
+    if table not in table_board.get():
+        return None
+    if table == "TAKEOUT":
+        phone = "".join(ch for ch in form.get("phoneNumber", "") if ch.isdigit())[:15]
+        return f"TAKEOUT:{phone}" if phone else None
+    return table
+
+def find_order_by_key(db, key):
+    return db.query(Order).filter_by(idempotencyKey=key).first() if key else None
+
+def order_result(o):
+    metrics.inc("order_idempotent_replays_total")
+    return render_template("order_result.html", total_price=o.totalPrice,
+                           order_id=o.order_id)
+
+def admission_control(fn):
+    def wrapper(*args, **kwargs):
+        if request.method != "POST":
+            return fn(*args, **kwargs)
+        if not order_inflight.acquire(timeout=0.2):
+            return order_busy(2, "busy")
+        try:
+            key = request.form.get("idempotencyKey", "")[:64]
+            if key:
+                with SessionLocal() as db:
+                    o = find_order_by_key(db, key)
+                    if o:
+                        return order_result(o)
+            bucket = admission_key(request.form)
+            if bucket is not None:
+                ok, retry_after = order_buckets.take(bucket)
+                if not ok:
+                    return order_busy(retry_after, "table")
+            return fn(*args, **kwargs)
+        finally:
+            order_inflight.release()
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
 # ─────────────────────────────────────────────────────────
 # 10) 주문
 # ─────────────────────────────────────────────────────────
+# 손님용 주문서 HTML 은 (메뉴 버전, 설정 버전) 마다 한 번만 렌더링해
+# gzip 본과 함께 보관한다. 로그인 사용자나 flash 메시지가 있으면
+# 화면이 달라지므로 캐시를 쓰지 않는다.
+_order_form_lock = threading.Lock()
+_order_form = None      # (key, etag, html bytes, gzip bytes)
+
+def cached_order_form():
+    global _order_form
+    key = (menu_cache.version, settings_cache.version)
+    cached = _order_form
+    if cached is None or cached[0] != key:
+        with _order_form_lock:
+            cached = _order_form
+            if cached is None or cached[0] != key:
+                settings = get_settings()
+                html = render_template("order_form.html",
+                                       menu_items=menu_cache.get(),
+                                       table_numbers=table_numbers(settings.total_tables),
+                                       settings=settings).encode("utf-8")
+                # ETag 은 내용에서: 버전 번호는 worker 마다 따로 세므로 비교 기준이 못 된다
+                cached = _order_form = (key, "form-" + hashlib.sha1(html).hexdigest()[:20],
+                                        html, gzip.compress(html, compresslevel=6))
+    _, etag, html, gz = cached
+
+    if request.if_none_match.contains(etag):
+        res = Response(status=304)
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        res = Response(gz, mimetype="text/html")
+        res.headers["Content-Encoding"] = "gzip"
+    else:
+        res = Response(html, mimetype="text/html")
+    res.set_etag(etag)
+    res.headers["Cache-Control"] = "no-cache"
+    res.headers["Vary"] = "Accept-Encoding, Cookie"
+    return res
+
 @app.route("/order", methods=["GET", "POST"])
+@admission_control
 def order():
-    with SessionLocal() as db:
-        menu_list = db.query(Menu).all()
-        settings  = db.query(Setting).filter_by(id=1).first()
-        table_numbers = ["TAKEOUT"] + [str(i) for i in range(1, settings.total_tables+1)]
+    if (request.method == "GET" and "role" not in session
+            and not session.get("_flashes")):
+        return cached_order_form()
 
+    menu_list = menu_cache.get()
+    settings  = get_settings()
+    with SessionLocal() as db:
         if request.method == "POST":
             table_number   = request.form.get("tableNumber", "")
             is_first_order = (request.form.get("isFirstOrder") == "true")
             people_count   = int(request.form.get("peopleCount", 0) or 0)
             notice_checked = (request.form.get("noticeChecked") == "on")
             phone_number   = request.form.get("phoneNumber", "").strip()
+            idempotency_key = request.form.get("idempotencyKey", "")[:64] or None
 
-            # 테이블 상태 객체
-            ts = db.query(TableState).filter_by(tableNumber=table_number).first()
-            if not ts:
-                ts = TableState(tableNumber=table_number)
-                db.add(ts)
-                db.commit()
-                db.refresh(ts)
+            # 테이블 상태 (메모리 현황판)
+            ts = table_board.get().get(table_number)
+            if table_number and ts is None:
+                flash("존재하지 않는 테이블입니다.", "error")
+                return redirect(url_for("order"))
 
             # 차단 확인
-            if ts.blocked:
+            if ts and ts.blocked:
                 flash("현재 차단된 테이블입니다. 주문 불가합니다.", "error")
                 return redirect(url_for("order"))
 
@@ -362,7 +2107,8 @@ def order():
                     return redirect(url_for("order"))
 
             # 주문 DB 반영
-            now_hhmmss = current_hhmmss()
+            hhmmss, epoch, day = now_stamp()
+            now_hhmmss = f"{hhmmss:06d}"
             total_price = sum(m.price * q for m, q in ordered_items)
 
             try:
@@ -373,19 +2119,36 @@ def order():
                     phoneNumber=phone_number,
                     totalPrice=total_price,
                     status="pending",
-                    createdAt=int(now_hhmmss)
+                    createdAt=hhmmss,
+                    createdTs=epoch,
+                    businessDay=day,
+                    idempotencyKey=idempotency_key
                 )
                 db.add(new_order)
                 db.flush()
 
                 for m, q in ordered_items:
                     db.add(OrderItem(order_id=new_order.id, menu_id=m.id, quantity=q))
+                emit_event(db, "ORDER_CREATED", order=new_order,
+                           stamp=(hhmmss, epoch, day),
+                           quantity=people_count, amount=total_price)
 
                 db.commit()
+                publish_event("order", action="created", id=new_order.id,
+                              table=table_number)
                 flash(f"주문이 접수되었습니다 (주문번호: {now_hhmmss}).")
                 return render_template("order_result.html",
                                        total_price=total_price,
                                        order_id=now_hhmmss)
+            except IntegrityError:
+                # 같은 키의 동시 재제출: 먼저 들어간 주문을 돌려준다
+                db.rollback()
+                o = find_order_by_key(db, idempotency_key)
+                if o:
+                    return order_result(o)
+                traceback.print_exc()
+                flash("주문 처리 중 오류가 발생했습니다.", "error")
+                return redirect(url_for("order"))
             except:
                 db.rollback()
                 flash("주문 처리 중 오류가 발생했습니다.", "error")
@@ -394,7 +2157,7 @@ def order():
         return render_template(
             "order_form.html",
             menu_items=menu_list,
-            table_numbers=table_numbers,
+            table_numbers=table_numbers(settings.total_tables),
             settings=settings
         )
 
@@ -408,120 +2171,37 @@ def admin():
     if sort_mode not in ["asc", "desc"]:
         sort_mode = "asc"
 
+    # SSE 갱신: 바뀐 조각 하나만 (static/js/app.js)
+    part = request.args.get("part")
+    if part is not None and part not in ADMIN_PARTS:
+        return Response("unknown part\n", status=404, mimetype="text/plain")
+
     with SessionLocal() as db:
-        s = db.query(Setting).filter_by(id=1).first()
-        total_tables = s.total_tables
-        table_list = ["TAKEOUT"] + [str(i) for i in range(1, total_tables + 1)]
-
-        now_min = hhmmss_to_minutes(current_hhmmss())
-
-        # 테이블 현황
-        table_status_info = []
-        for t in table_list:
-            ts = db.query(TableState).filter_by(tableNumber=t).first()
-            if ts:
-                blocked = ts.blocked
-                if ts.usageStart is not None:
-                    diff = now_min - hhmmss_to_minutes(f"{ts.usageStart:06d}")
-                    color = "red" if diff >= s.time_warning2 else (
-                            "yellow" if diff >= s.time_warning1 else "normal")
-                    table_status_info.append((t, f"{diff}분", color, blocked, False))
-                else:
-                    table_status_info.append((t, "-", "empty", blocked, True))
-            else:
-                table_status_info.append((t, "-", "empty", False, True))
-
-        order_by_clause = Order.id.asc() if sort_mode == "asc" else Order.id.desc()
-
-        # pending
-        pending_orders = []
-        for o in db.query(Order).filter_by(status="pending").order_by(order_by_clause):
-            items = [{"menuName": it.menu.name, "quantity": it.quantity} for it in o.items]
-            first_flag = (o.peopleCount > 0)
-            recent_first = db.query(Order).filter(
-                Order.tableNumber == o.tableNumber,
-                Order.peopleCount > 0
-            ).order_by(Order.id.desc()).first()
-            pending_orders.append({
-                "id": o.id, "order_id": o.order_id,
-                "tableNumber": o.tableNumber,
-                "peopleCount": o.peopleCount,
-                "phoneNumber": o.phoneNumber,
-                "totalPrice": o.totalPrice,
-                "items": items,
-                "is_first": first_flag,
-                "recent_first_time": recent_first.order_id if recent_first else "",
-                "stock_negative_warning": any(it.menu.stock < 0 for it in o.items),
-                "createdAt": o.createdAt
-            })
+        if part:
+            snapshot = build_admin_snapshot(db, sort_mode, parts=(part,))
+        else:
+            snapshot = build_admin_snapshot(db, sort_mode)
 
-        # paid
-        paid_orders = []
-        for o in db.query(Order).filter_by(status="paid").order_by(order_by_clause):
-            items = [{
-                "menuName": it.menu.name,
-                "quantity": it.quantity,
-                "doneQuantity": it.doneQuantity,
-                "deliveredQuantity": it.deliveredQuantity
-            } for it in o.items]
-            paid_orders.append({
-                "id": o.id, "order_id": o.order_id,
-                "tableNumber": o.tableNumber,
-                "totalPrice": o.totalPrice,
-                "items": items,
-                "service": o.service,
-                "phoneNumber": o.phoneNumber,
-                "createdAt": o.createdAt
-            })
+    if part:
+        return render_template(ADMIN_PARTS[part], sort_mode=sort_mode, **snapshot)
+    return render_template("admin.html", sort_mode=sort_mode, **snapshot)
 
-        # completed
-        completed_orders = []
-        for o in db.query(Order).filter_by(status="completed").order_by(order_by_clause):
-            completed_orders.append({
-                "id": o.id, "order_id": o.order_id,
-                "tableNumber": o.tableNumber,
-                "totalPrice": o.totalPrice,
-                "service": o.service,
-                "phoneNumber": o.phoneNumber,
-                "createdAt": o.createdAt
-            })
+@app.route("/admin/closed/<status>")
+@login_required
+def admin_closed_orders(status):
+    """완료/거절 주문 "더 보기" 조각"""
+    if status not in ("completed", "rejected"):
+        return Response("unknown status\n", status=404, mimetype="text/plain")
+    sort_mode = request.args.get("sort", "asc")
+    if sort_mode not in ["asc", "desc"]:
+        sort_mode = "asc"
+    after = request.args.get("after", type=int)
 
-        # rejected
-        rejected_orders = []
-        for o in db.query(Order).filter_by(status="rejected").order_by(order_by_clause):
-            rejected_orders.append({
-                "id": o.id, "order_id": o.order_id,
-                "tableNumber": o.tableNumber,
-                "phoneNumber": o.phoneNumber,
-                "createdAt": o.createdAt
-            })
+    with SessionLocal() as db:
+        page = closed_orders_page(db, status, sort_mode, after)
 
-        # 메뉴
-        menu_items = [{
-            "id": m.id, "name": m.name,
-            "price": m.price, "category": m.category,
-            "stock": m.stock, "soldOut": m.sold_out
-        } for m in db.query(Menu).all()]
-
-        sales_sum = db.query(
-            func.coalesce(func.sum(Order.totalPrice), 0)
-        ).filter(
-            Order.service == False,
-            or_(Order.status == "paid", Order.status == "completed")
-        ).scalar()
-
-    return render_template(
-        "admin.html",
-        table_status_info=table_status_info,
-        pending_orders=pending_orders,
-        paid_orders=paid_orders,
-        completed_orders=completed_orders,
-        rejected_orders=rejected_orders,
-        menu_items=menu_items,
-        current_sales=sales_sum,
-        settings=s,
-        sort_mode=sort_mode
-    )
+    return render_template("admin_closed_orders.html", status=status,
+                           sort_mode=sort_mode, **page)
 
 # ─────────────────────────────────────────────────────────
 # 11-1) 테이블 empty / block 토글
@@ -529,12 +2209,15 @@ def admin():
 @app.route("/admin/empty_table/<table_num>", methods=["POST"])
 @login_required
 def admin_empty_table(table_num):
+    if table_num not in table_board.get():
+        flash("존재하지 않는 테이블입니다.", "error")
+        return redirect(url_for("admin"))
     with SessionLocal() as db:
-        ts = db.query(TableState).filter_by(tableNumber=table_num).first()
-        if ts:
-            ts.usageStart = None
+        emit_event(db, "TABLE_EMPTIED", tableNumber=table_num)
+        log_action(session["role"], "EMPTY_TABLE", f"table={table_num}", db=db)
         db.commit()
-    log_action(session["role"], "EMPTY_TABLE", f"table={table_num}")
+    project_now()
+    publish_event("table", action="empty", table=table_num)
     flash(f"{table_num}번 테이블이(가) 비워졌습니다.")
     return redirect(url_for("admin"))
 
@@ -542,15 +2225,18 @@ def admin_empty_table(table_num):
 @login_required
 def admin_block_table(table_num):
     with SessionLocal() as db:
-        ts = db.query(TableState).filter_by(tableNumber=table_num).first()
+        ts = (db.query(TableState).filter_by(tableNumber=table_num)
+                .with_for_update().first())
         if not ts:
-            ts = TableState(tableNumber=table_num)
-            db.add(ts)
-            db.commit()
-            db.refresh(ts)
-        ts.blocked = not ts.blocked
+            flash("존재하지 않는 테이블입니다.", "error")
+            return redirect(url_for("admin"))
+        blocked = ts.blocked = not ts.blocked
+        emit_event(db, "TABLE_BLOCKED", tableNumber=table_num, quantity=int(blocked))
+        log_action(session["role"], "BLOCK_TOGGLE",
+                   f"table={table_num} blocked={blocked}", db=db)
         db.commit()
-    log_action(session["role"], "BLOCK_TOGGLE", f"table={table_num} blocked={ts.blocked}")
+    table_board.bump()
+    publish_event("table", action="block", table=table_num, blocked=blocked)
     flash(f"{table_num}번 테이블 차단 상태가 변경되었습니다.")
     return redirect(url_for("admin"))
 
@@ -562,37 +2248,16 @@ def admin_block_table(table_num):
 def admin_confirm(order_id):
     with SessionLocal() as db:
         try:
-            o = db.query(Order).filter_by(id=order_id).with_for_update().first()
-            if not o or o.status != "pending":
+            confirmed = confirm_orders(db, [order_id], session["role"])
+            if not confirmed:
                 flash("해당 주문은 'pending' 상태가 아닙니다.")
                 return redirect(url_for("admin"))
-
-            # 상태 변경
-            o.status      = "paid"
-            o.confirmedAt = int(current_hhmmss())
-
-            # 테이블 사용 시작
-            if o.peopleCount > 0:
-                ts = db.query(TableState).filter_by(tableNumber=o.tableNumber).first()
-                if ts and ts.usageStart is None:
-                    ts.usageStart = o.confirmedAt
-
-            # 세트메뉴 연쇄 차감용 메뉴 객체
-            pork  = db.query(Menu).filter_by(name="포크 앙 투움바 (Pork en Toowoomba)").with_for_update().first()
-            roule = db.query(Menu).filter_by(name="떡 롤레 (Tteok Roulé)").with_for_update().first()
-
-            # 재고 차감
-            for it in o.items:
-                m = db.query(Menu).filter_by(id=it.menu_id).with_for_update().first()
-                m.stock -= it.quantity
-                # set 메뉴면 각 구성 품목도 차감
-                if m.category == "set":
-                    pork.stock  -= it.quantity
-                    roule.stock -= it.quantity
-
             db.commit()
-            log_action(session["role"], "CONFIRM_ORDER", f"주문ID={order_id}")
+            after_confirm(confirmed)
             flash(f"주문 {order_id} 입금확인 완료!")
+        except StockShortage as e:
+            db.rollback()
+            flash(f"재고 부족으로 입금확인할 수 없습니다: {menu_names(e.menu_ids)}", "error")
         except:
             db.rollback()
             traceback.print_exc()
@@ -600,6 +2265,55 @@ def admin_confirm(order_id):
 
     return redirect(url_for("admin"))
 
+def confirm_orders(db, order_ids, role):
+    """
+    pending 주문들을 한 트랜잭션에서 paid 로 (커밋은 호출자가).
+    주문 행은 id 순으로 잠그고, 재고는 전체 합산 벡터로 한 번만 차감한다.
+    반환: [(주문 pk, 확정 epoch)]
+    """
+    orders = (db.query(Order)
+                .filter(Order.id.in_(order_ids), Order.status == "pending")
+                .options(selectinload(Order.items))
+                .order_by(Order.id)
+                .with_for_update()
+                .all())
+    if not orders:
+        return []
+
+    # 상태 변경
+    stamp = hhmmss, epoch, _ = now_stamp()
+    for o in orders:
+        o.status      = "paid"
+        o.confirmedAt = hhmmss
+        o.confirmedTs = epoch
+
+    # 재고 차감 (세트 구성품 포함)
+    items = [it for o in orders for it in o.items]
+    apply_stock_decrements(
+        db, stock_decrements(db, [(it.menu_id, it.quantity) for it in items])
+    )
+
+    # 테이블 사용 시작 / 주방 미조리 / 매출은 이 이벤트들로부터 (5-3-1)
+    price = {m.id: m.price for m in menu_cache.get()}
+    for o in orders:
+        emit_event(db, "ORDER_CONFIRMED", order=o, stamp=stamp,
+                   quantity=o.peopleCount, amount=o.totalPrice)
+        for it in o.items:
+            emit_event(db, "ITEM_CONFIRMED", order=o, stamp=stamp, item_id=it.id,
+                       menu_id=it.menu_id, quantity=it.quantity,
+                       amount=price[it.menu_id] * it.quantity)
+        log_action(role, "CONFIRM_ORDER", f"주문ID={o.id}", db=db)
+    return [(o.id, epoch) for o in orders]
+
+def after_confirm(confirmed):
+    """confirm_orders 커밋 이후: projection, 캐시, 알림 스케줄, 이벤트"""
+    project_now()
+    menu_cache.bump()
+    for order_pk, epoch in confirmed:
+        time_warnings.schedule(order_pk, epoch)
+        publish_event("order", action="confirmed", id=order_pk, ts=epoch)
+    publish_event("stock", action="decrement")
+
 # ─────────────────────────────────────────────────────────
 # 11-3) 주문 거절
 # ─────────────────────────────────────────────────────────
@@ -613,8 +2327,10 @@ def admin_reject(order_id):
                 flash("해당 주문은 'pending' 상태가 아닙니다.")
                 return redirect(url_for("admin"))
             o.status = "rejected"
+            emit_event(db, "ORDER_REJECTED", order=o)
+            log_action(session["role"], "REJECT_ORDER", f"주문ID={order_id}", db=db)
             db.commit()
-            log_action(session["role"], "REJECT_ORDER", f"주문ID={order_id}")
+            publish_event("order", action="rejected", id=order_id)
             flash(f"주문 {order_id}를 거절 처리했습니다.")
         except:
             db.rollback()
@@ -622,6 +2338,57 @@ def admin_reject(order_id):
             flash("주문 거절 처리 중 오류가 발생했습니다.", "error")
     return redirect(url_for("admin"))
 
+# ─────────────────────────────────────────────────────────
+# 11-3-1) 선택한 주문 일괄 입금확인 / 거절 (한 트랜잭션)
+# ─────────────────────────────────────────────────────────
+@app.route("/admin/batch", methods=["POST"])
+@login_required
+def admin_batch():
+    action = request.form.get("action", "")
+    order_ids = sorted({int(i) for i in request.form.getlist("order_ids") if i.isdigit()})
+    if action not in ("confirm", "reject") or not order_ids:
+        flash("처리할 주문을 선택해주세요.", "error")
+        return redirect(url_for("admin"))
+
+    with SessionLocal() as db:
+        try:
+            if action == "confirm":
+                confirmed = confirm_orders(db, order_ids, session["role"])
+                done = [pk for pk, _ in confirmed]
+            else:
+                rows = (db.query(Order.id, Order.tableNumber, Order.businessDay)
+                          .filter(Order.id.in_(order_ids), Order.status == "pending")
+                          .order_by(Order.id)
+                          .with_for_update()
+                          .all())
+                done = [r.id for r in rows]
+                if done:
+                    db.execute(update(Order).where(Order.id.in_(done))
+                               .values(status="rejected"))
+                    for r in rows:
+                        emit_event(db, "ORDER_REJECTED", order=r)
+                        log_action(session["role"], "REJECT_ORDER", f"주문ID={r.id}", db=db)
+            db.commit()
+        except StockShortage as e:
+            db.rollback()
+            flash(f"재고 부족으로 입금확인할 수 없습니다 (전체 취소): {menu_names(e.menu_ids)}", "error")
+            return redirect(url_for("admin"))
+        except:
+            db.rollback()
+            traceback.print_exc()
+            flash("일괄 처리 중 오류가 발생했습니다.", "error")
+            return redirect(url_for("admin"))
+
+    if action == "confirm":
+        after_confirm(confirmed)
+    else:
+        for pk in done:
+            publish_event("order", action="rejected", id=pk)
+    skipped = len(order_ids) - len(done)
+    label = "입금확인" if action == "confirm" else "거절"
+    flash(f"{len(done)}건 {label} 완료" + (f" ({skipped}건은 pending 이 아니라 건너뜀)" if skipped else ""))
+    return redirect(url_for("admin"))
+
 # ─────────────────────────────────────────────────────────
 # 11-4) paid → completed
 # ─────────────────────────────────────────────────────────
@@ -635,8 +2402,17 @@ def admin_complete(order_id):
                 flash("해당 주문은 'paid' 상태가 아닙니다.")
                 return redirect(url_for("admin"))
             o.status = "completed"
+            emit_event(db, "ORDER_COMPLETED", order=o)
+            # 조리되지 않은 채 완료된 수량은 주방 집계에서 제외
+            for it in o.items:
+                left = it.quantity - (it.doneQuantity or 0)
+                if left > 0:
+                    emit_event(db, "ITEM_CANCELLED", order=o, item_id=it.id,
+                               menu_id=it.menu_id, quantity=left)
+            log_action(session["role"], "COMPLETE_ORDER", f"주문ID={order_id}", db=db)
             db.commit()
-            log_action(session["role"], "COMPLETE_ORDER", f"주문ID={order_id}")
+            project_now()
+            publish_event("order", action="completed", id=order_id)
             flash(f"주문 {order_id} 최종 완료되었습니다!")
         except:
             db.rollback()
@@ -647,9 +2423,33 @@ def admin_complete(order_id):
 # ─────────────────────────────────────────────────────────
 # 11-5) 전달 수량 처리
 # ─────────────────────────────────────────────────────────
-@app.route("/admin/deliver_item_count/<int:order_id>/<menu_name>", methods=["POST"])
+def complete_delivered(db, order_ids):
+    """
+    항목이 모두 전달된 paid 주문을 completed 로. 완료된 주문 pk 목록 반환.
+    호출자는 주문 행을 먼저 잠가 둔다. 잠금 읽기로 다른 트랜잭션이 커밋한
+    전달까지 보고, UPDATE 로 실제 바뀐 주문에만 ORDER_COMPLETED 를 남긴다.
+    """
+    undelivered = (select(OrderItem.id)
+                   .where(OrderItem.order_id == Order.id,
+                          OrderItem.deliveredQuantity < OrderItem.quantity)
+                   .exists())
+    rows = (db.query(Order.id, Order.tableNumber, Order.businessDay)
+              .filter(Order.id.in_(order_ids), Order.status == "paid", ~undelivered)
+              .order_by(Order.id)
+              .with_for_update()
+              .all())
+    done = []
+    for r in rows:
+        res = db.execute(update(Order).where(Order.id == r.id, Order.status == "paid")
+                         .values(status="completed"))
+        if res.rowcount:
+            emit_event(db, "ORDER_COMPLETED", order=r)
+            done.append(r.id)
+    return done
+
+@app.route("/admin/deliver_item/<int:item_id>", methods=["POST"])
 @login_required
-def admin_deliver_item_count(order_id, menu_name):
+def admin_deliver_item(item_id):
     try:
         count = int(request.form.get("deliver_count", "0"))
     except ValueError:
@@ -660,31 +2460,42 @@ def admin_deliver_item_count(order_id, menu_name):
 
     with SessionLocal() as db:
         try:
-            o  = db.query(Order).filter_by(id=order_id).with_for_update().first()
-            if not o or o.status not in ["paid", "completed"]:
+            item = (db.query(OrderItem.order_id, OrderItem.menu_id)
+                      .filter(OrderItem.id == item_id).first())
+            # 주문 행을 먼저 잠근다 (deliver_table 과 같은 주문 → 항목 순서):
+            # 같은 주문의 마지막 항목들이 동시에 전달돼도 뒤에 잠금을 얻은 쪽이
+            # 앞의 전달을 보고 주문을 완료한다
+            o = item and (db.query(Order.order_id, Order.tableNumber,
+                                   Order.businessDay, Order.status)
+                            .filter(Order.id == item.order_id)
+                            .with_for_update()
+                            .first())
+            if not o or o.status not in ("paid", "completed"):
                 flash("해당 주문 상태가 조리중이 아닙니다.", "error")
                 return redirect(url_for("admin"))
-
-            it = next((i for i in o.items if i.menu.name == menu_name), None)
-            if not it:
-                flash("해당 메뉴가 주문에 없습니다.", "error")
-                return redirect(url_for("admin"))
-
-            left = it.doneQuantity - it.deliveredQuantity
-            if left < count:
+            order_pk, menu_id = item
+            order_no, table, day = o.order_id, o.tableNumber, o.businessDay
+
+            # 조리 완료분 안에서만 증가 (동시 요청도 초과 불가)
+            res = db.execute(
+                update(OrderItem)
+                .where(OrderItem.id == item_id,
+                       OrderItem.doneQuantity - OrderItem.deliveredQuantity >= count)
+                .values(deliveredQuantity=OrderItem.deliveredQuantity + count)
+            )
+            if res.rowcount == 0:
+                db.rollback()
                 flash("전달 수량 초과입니다.", "error")
                 return redirect(url_for("admin"))
 
-            it.deliveredQuantity += count
-
-            # 전체 전달 완료 검사
-            all_delivered = all(x.deliveredQuantity >= x.quantity for x in o.items)
-            if all_delivered:
-                o.status = "completed"
-
-            db.commit()
+            emit_event(db, "ITEM_DELIVERED", order_id=order_pk, tableNumber=table,
+                       businessDay=day, item_id=item_id, menu_id=menu_id, quantity=count)
+            complete_delivered(db, [order_pk])
+            menu_name = menu_names([menu_id])
             log_action(session["role"], "DELIVER_ITEM",
-                       f"{o.order_id}/{menu_name}/{count}")
+                       f"{order_no}/{menu_name}/{count}", db=db)
+            db.commit()
+            publish_event("order", action="delivered", id=order_pk)
             flash(f"[{menu_name}] {count}개 전달 완료!")
         except:
             db.rollback()
@@ -692,6 +2503,55 @@ def admin_deliver_item_count(order_id, menu_name):
             flash("전달 처리 중 오류가 발생했습니다.", "error")
     return redirect(url_for("admin"))
 
+@app.route("/admin/deliver_table/<table_num>", methods=["POST"])
+@login_required
+def admin_deliver_table(table_num):
+    """테이블의 paid 주문에서 조리 완료된 것을 모두 전달 (항목 UPDATE 한 문장)"""
+    with SessionLocal() as db:
+        try:
+            # 주문 행 → 항목 행 순서로 잠근다 (deliver_item 과 같은 순서)
+            order_ids = [pk for (pk,) in db.query(Order.id)
+                                          .filter(Order.businessDay == business_day(),
+                                                  Order.tableNumber == table_num,
+                                                  Order.status == "paid")
+                                          .order_by(Order.id)
+                                          .with_for_update()]
+            pending = []
+            if order_ids:
+                pending = (db.query(OrderItem.id, OrderItem.order_id, OrderItem.menu_id,
+                                    OrderItem.doneQuantity - OrderItem.deliveredQuantity)
+                             .filter(OrderItem.order_id.in_(order_ids),
+                                     OrderItem.doneQuantity > OrderItem.deliveredQuantity)
+                             .order_by(OrderItem.id)
+                             .with_for_update()
+                             .all())
+            items = len(pending)
+            if pending:
+                db.execute(update(OrderItem)
+                           .where(OrderItem.id.in_([item_id for item_id, *_ in pending]))
+                           .values(deliveredQuantity=OrderItem.doneQuantity))
+                for item_id, order_pk, menu_id, count in pending:
+                    emit_event(db, "ITEM_DELIVERED", order_id=order_pk, tableNumber=table_num,
+                               businessDay=business_day(), item_id=item_id,
+                               menu_id=menu_id, quantity=count)
+            if not items:
+                flash(f"{table_num}번 테이블에 전달할 조리 완료 항목이 없습니다.")
+                return redirect(url_for("admin"))
+            completed = complete_delivered(db, order_ids)
+            log_action(session["role"], "DELIVER_TABLE",
+                       f"table={table_num} items={items} completed={len(completed)}", db=db)
+            db.commit()
+        except:
+            db.rollback()
+            traceback.print_exc()
+            flash("전달 처리 중 오류가 발생했습니다.", "error")
+            return redirect(url_for("admin"))
+    for pk in order_ids:
+        publish_event("order", action="delivered", id=pk)
+    flash(f"{table_num}번 테이블 조리 완료 항목 {items}건 전달"
+          + (f", 주문 {len(completed)}건 완료" if completed else ""))
+    return redirect(url_for("admin"))
+
 # ─────────────────────────────────────────────────────────
 # 11-6) 품절 토글
 # ─────────────────────────────────────────────────────────
@@ -702,8 +2562,11 @@ def admin_soldout(menu_id):
         try:
             m = db.query(Menu).filter_by(id=menu_id).first()
             m.sold_out = not m.sold_out
+            emit_event(db, "SOLDOUT_SET", menu_id=menu_id, quantity=int(m.sold_out))
+            log_action(session["role"], "SOLDOUT_TOGGLE", f"{m.name}={m.sold_out}", db=db)
             db.commit()
-            log_action(session["role"], "SOLDOUT_TOGGLE", f"{m.name}={m.sold_out}")
+            menu_cache.bump()
+            publish_event("stock", action="soldout", menu_id=menu_id)
             flash(f"메뉴 [{m.name}] 품절상태 변경!")
         except:
             db.rollback()
@@ -728,9 +2591,12 @@ def admin_update_stock(menu_id):
             m = db.query(Menu).filter_by(id=menu_id).first()
             old_stock = m.stock
             m.stock = new_stock
-            db.commit()
+            emit_event(db, "STOCK_SET", menu_id=menu_id, quantity=new_stock)
             log_action(session["role"], "UPDATE_STOCK",
-                       f"{m.name}: {old_stock}→{new_stock}")
+                       f"{m.name}: {old_stock}→{new_stock}", db=db)
+            db.commit()
+            menu_cache.bump()
+            publish_event("stock", action="update", menu_id=menu_id)
             flash(f"[{m.name}] 재고가 {new_stock} 으로 수정되었습니다.")
         except:
             db.rollback()
@@ -738,6 +2604,149 @@ def admin_update_stock(menu_id):
             flash("재고 수정 중 오류가 발생했습니다.", "error")
     return redirect(url_for("admin"))
 
+# ─────────────────────────────────────────────────────────
+# 11-7-1) 재고 / 품절 일괄 수정 (폼 또는 CSV 업로드)
+#         CSV 형식: menu,stock,sold_out  (menu 는 메뉴명 또는 id,
+#                   stock / sold_out 은 비워 두면 그대로)
+# ─────────────────────────────────────────────────────────
+TRUE_WORDS = ("1", "true", "y", "yes", "on", "품절")
+
+def parse_stock_csv(data, menus):
+    """업로드된 CSV → {menu_id: {"stock": n, "sold_out": b}}, 오류 목록"""
+    by_name = {m.name: m.id for m in menus}
+    by_id = {str(m.id): m.id for m in menus}
+    changes, errors = {}, []
+    try:
+        text_data = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        try:
+            text_data = data.decode("cp949")      # 한글 Excel 기본 저장 형식
+        except UnicodeDecodeError:
+            return {}, ["CSV 인코딩을 읽을 수 없습니다 (UTF-8 또는 CP949 로 저장해주세요)"]
+    reader = csv.DictReader(io.StringIO(text_data))
+    for lineno, row in enumerate(reader, start=2):
+        key = (row.get("menu") or row.get("id") or "").strip()
+        menu_id = by_id.get(key) or by_name.get(key)
+        if menu_id is None:
+            errors.append(f"{lineno}행: 메뉴 '{key}' 없음")
+            continue
+        change = {}
+        stock = (row.get("stock") or "").strip()
+        if stock:
+            try:
+                change["stock"] = int(stock)
+            except ValueError:
+                errors.append(f"{lineno}행: 재고 '{stock}' 가 숫자가 아님")
+                continue
+        sold_out = (row.get("sold_out") or "").strip().lower()
+        if sold_out:
+            change["sold_out"] = sold_out in TRUE_WORDS
+        changes[menu_id] = change
+    return changes, errors
+
+def parse_stock_form(form, menus):
+    """
+    일괄 수정 폼 (stock_<id>, soldout_<id> 체크박스).
+    화면에 그렸던 값(orig_stock_<id>, orig_soldout_<id>)과 다른 칸만 변경으로 본다.
+    """
+    changes, errors = {}, []
+    for m in menus:
+        change = {}
+        orig_soldout = form.get(f"orig_soldout_{m.id}")
+        sold_out = form.get(f"soldout_{m.id}") == "on"
+        if orig_soldout is None or sold_out != (orig_soldout == "1"):
+            change["sold_out"] = sold_out
+        raw = form.get(f"stock_{m.id}", "").strip()
+        orig = form.get(f"orig_stock_{m.id}", "").strip()
+        if raw:
+            try:
+                stock = int(raw)
+                orig_stock = int(orig) if orig else None
+            except ValueError:
+                errors.append(f"[{m.name}] 재고 '{raw}' 가 숫자가 아님")
+                continue
+            if stock != orig_stock:
+                change["stock"] = stock
+                change["orig_stock"] = orig_stock
+        if change:
+            changes[m.id] = change
+    return changes, errors
+
+@app.route("/admin/bulk_stock", methods=["POST"])
+@login_required
+def admin_bulk_stock():
+    menus = menu_cache.get()
+    upload = request.files.get("stock_csv")
+    if upload and upload.filename:
+        changes, errors = parse_stock_csv(upload.read(), menus)
+    else:
+        changes, errors = parse_stock_form(request.form, menus)
+    if errors:
+        flash("일괄 수정 실패: " + "; ".join(errors[:5]), "error")
+        return redirect(url_for("admin"))
+
+    current = {m.id: m for m in menus}
+    plans = []      # (바뀐 컬럼만 담은 row, 폼에서 본 재고, 로그)
+    for menu_id in sorted(changes):
+        m, change = current[menu_id], changes[menu_id]
+        orig_stock = change.get("orig_stock")
+        row, logs = {"id": menu_id}, []
+        if "stock" in change and (orig_stock is not None or change["stock"] != m.stock):
+            row["stock"] = change["stock"]
+            before = m.stock if orig_stock is None else orig_stock
+            logs.append(("UPDATE_STOCK", f"{m.name}: {before}→{change['stock']}"))
+        if "sold_out" in change and change["sold_out"] != m.sold_out:
+            row["sold_out"] = change["sold_out"]
+            logs.append(("SOLDOUT_TOGGLE", f"{m.name}={change['sold_out']}"))
+        if len(row) > 1:
+            plans.append((row, orig_stock if "stock" in row else None, logs))
+    if not plans:
+        flash("바뀐 재고/품절 항목이 없습니다.")
+        return redirect(url_for("admin"))
+
+    applied, conflicts = [], []
+    with SessionLocal() as db:
+        try:
+            # 폼으로 바꾼 재고는 화면에 보였던 값일 때만 (그 사이 입금확인 차감을 덮지 않도록)
+            for row, orig_stock, logs in plans:
+                if orig_stock is None:
+                    continue
+                values = {k: v for k, v in row.items() if k != "id"}
+                res = db.execute(update(Menu)
+                                 .where(Menu.id == row["id"], Menu.stock == orig_stock)
+                                 .values(**values))
+                if res.rowcount:
+                    applied.append((row, logs))
+                else:
+                    conflicts.append(current[row["id"]].name)
+            plain = [(row, logs) for row, orig_stock, logs in plans if orig_stock is None]
+            if plain:
+                db.execute(update(Menu), [row for row, _ in plain])    # id 기준 bulk UPDATE
+                applied += plain
+            for row, logs in applied:
+                if "stock" in row:
+                    emit_event(db, "STOCK_SET", menu_id=row["id"], quantity=row["stock"])
+                if "sold_out" in row:
+                    emit_event(db, "SOLDOUT_SET", menu_id=row["id"],
+                               quantity=int(row["sold_out"]))
+                for action, detail in logs:
+                    log_action(session["role"], action, detail, db=db)
+            db.commit()
+        except:
+            db.rollback()
+            traceback.print_exc()
+            flash("일괄 수정 중 오류가 발생했습니다.", "error")
+            return redirect(url_for("admin"))
+    if conflicts:
+        flash("화면을 연 뒤 재고가 바뀌어 적용하지 않은 메뉴: " + ", ".join(conflicts)
+              + " (새로고침 후 다시 입력해주세요)", "error")
+    if not applied:
+        return redirect(url_for("admin"))
+    menu_cache.bump()
+    publish_event("stock", action="bulk_update", count=len(applied))
+    flash(f"{len(applied)}개 메뉴의 재고/품절 상태를 수정했습니다.")
+    return redirect(url_for("admin"))
+
 # ─────────────────────────────────────────────────────────
 # 11-8) 옵션/제약 설정 저장
 # ─────────────────────────────────────────────────────────
@@ -746,6 +2755,7 @@ def admin_update_stock(menu_id):
 def admin_update_settings():
     update_settings(request.form)
     log_action(session["role"], "UPDATE_SETTINGS", "옵션 수정")
+    publish_event("settings", action="update")
     flash("설정이 업데이트되었습니다.")
     return redirect(url_for("admin"))
 
@@ -763,45 +2773,57 @@ def admin_service():
         flash("서비스 등록 실패: 테이블/메뉴/수량 확인 필요", "error")
         return redirect(url_for("admin"))
 
-    with SessionLocal() as db:
-        ts = db.query(TableState).filter_by(tableNumber=table).first()
-        if not ts:
-            ts = TableState(tableNumber=table)
-            db.add(ts)
-            db.commit()
-            db.refresh(ts)
+    ts = table_board.get().get(table)
+    if ts is None:
+        flash("존재하지 않는 테이블입니다.", "error")
+        return redirect(url_for("admin"))
 
+    with SessionLocal() as db:
         if ts.blocked:
             flash("차단된 테이블에는 서비스를 등록할 수 없습니다.", "error")
             return redirect(url_for("admin"))
 
-        m = db.query(Menu).filter_by(name=menu_name).with_for_update().first()
+        m = db.query(Menu).filter_by(name=menu_name).first()
         if not m or m.sold_out:
             flash("해당 메뉴가 없거나 품절입니다.", "error")
             return redirect(url_for("admin"))
 
-        now_str = current_hhmmss()
+        hhmmss, epoch, day = now_stamp()
         try:
             new_order = Order(
-                order_id=now_str,
+                order_id=f"{hhmmss:06d}",
                 tableNumber=table,
                 peopleCount=0,
                 phoneNumber="",
                 totalPrice=0,
                 status="paid",
-                createdAt=int(now_str),
-                confirmedAt=int(now_str),
+                createdAt=hhmmss,
+                confirmedAt=hhmmss,
+                createdTs=epoch,
+                confirmedTs=epoch,
+                businessDay=day,
                 service=True
             )
             db.add(new_order)
             db.flush()
-            db.add(OrderItem(order_id=new_order.id, menu_id=m.id,
-                             quantity=qty))
-            m.stock -= qty
-            db.commit()
+            item = OrderItem(order_id=new_order.id, menu_id=m.id, quantity=qty)
+            db.add(item)
+            apply_stock_decrements(db, stock_decrements(db, [(m.id, qty)]))
+            db.flush()
+            emit_event(db, "SERVICE_ADDED", order=new_order, item_id=item.id,
+                       menu_id=m.id, quantity=qty, amount=0)
             log_action(session["role"], "ADMIN_SERVICE",
-                       f"{table}/{menu_name}/{qty}")
+                       f"{table}/{menu_name}/{qty}", db=db)
+            db.commit()
+            project_now()
+            menu_cache.bump()
+            time_warnings.schedule(new_order.id, epoch)
+            publish_event("order", action="service", id=new_order.id, table=table, ts=epoch)
+            publish_event("stock", action="decrement")
             flash("0원 서비스 주문이 등록되었습니다.")
+        except StockShortage as e:
+            db.rollback()
+            flash(f"재고 부족으로 서비스를 등록할 수 없습니다: {menu_names(e.menu_ids)}", "error")
         except:
             db.rollback()
             traceback.print_exc()
@@ -811,42 +2833,111 @@ def admin_service():
 # ─────────────────────────────────────────────────────────
 # 11-10) 로그 페이지
 # ─────────────────────────────────────────────────────────
+LOG_PAGE_SIZE = 100
+
+def log_filters(args):
+    return {
+        "role":       args.get("role", ""),
+        "action":     args.get("action", ""),
+        "detail":     args.get("detail", ""),
+        "time_start": args.get("time_start", ""),
+        "time_end":   args.get("time_end", ""),
+    }
+
+def log_conditions(f):
+    """필터 → WHERE 조건 목록. role/action 은 인덱스를 타는 정확 일치"""
+    conds = []
+    if f["role"]:
+        conds.append(Log.role == f["role"])
+    if f["action"]:
+        conds.append(Log.action == f["action"])
+    if f["detail"]:
+        conds.append(Log.detail.ilike(f"%{f['detail']}%"))
+    if f["time_start"].isdigit() and len(f["time_start"]) == 6:
+        conds.append(Log.time >= int(f["time_start"]))
+    if f["time_end"].isdigit() and len(f["time_end"]) == 6:
+        conds.append(Log.time <= int(f["time_end"]))
+    return conds
+
 @app.route("/admin/log")
 @login_required
 def admin_log_page():
-    role_filter   = request.args.get("role", "")
-    action_filter = request.args.get("action", "")
-    detail_filter = request.args.get("detail", "")
-    time_start    = request.args.get("time_start", "")
-    time_end      = request.args.get("time_end", "")
-
-    with SessionLocal() as db:
-        q = db.query(Log)
-        if role_filter:
-            q = q.filter(Log.role.ilike(f"%{role_filter}%"))
-        if action_filter:
-            q = q.filter(Log.action.ilike(f"%{action_filter}%"))
-        if detail_filter:
-            q = q.filter(Log.detail.ilike(f"%{detail_filter}%"))
-        if time_start.isdigit() and len(time_start) == 6:
-            q = q.filter(Log.time >= int(time_start))
-        if time_end.isdigit() and len(time_end) == 6:
-            q = q.filter(Log.time <= int(time_end))
-
-        logs = [{
-            "time": f"{l.time:06d}",
-            "role": l.role,
-            "action": l.action,
-            "detail": l.detail
-        } for l in q.order_by(Log.id.desc())]
+    filters = log_filters(request.args)
+    before  = request.args.get("before", type=int)
+
+    with SessionLocal() as db:
+        q = db.query(Log).filter(*log_conditions(filters))
+        if before:
+            q = q.filter(Log.id < before)
+        rows = q.order_by(Log.id.desc()).limit(LOG_PAGE_SIZE + 1).all()
+
+    has_more = len(rows) > LOG_PAGE_SIZE
+    rows = rows[:LOG_PAGE_SIZE]
+    logs = [{
+        "time": f"{l.time:06d}",
+        "role": l.role,
+        "action": l.action,
+        "detail": l.detail
+    } for l in rows]
 
     return render_template("admin_log.html",
                            logs=logs,
-                           role_filter=role_filter,
-                           action_filter=action_filter,
-                           detail_filter=detail_filter,
-                           time_start=time_start,
-                           time_end=time_end)
+                           next_before=rows[-1].id if has_more else None,
+                           filters=filters,
+                           log_roles=LOG_ROLES,
+                           log_actions=LOG_ACTIONS)
+
+@app.route("/admin/log/export")
+@login_required
+def admin_log_export():
+    """필터 결과 전체를 서버 측 커서로 읽으며 CSV / NDJSON 으로 흘려보낸다"""
+    fmt = request.args.get("format", "csv")
+    if fmt not in ["csv", "ndjson"]:
+        fmt = "csv"
+    conds = log_conditions(log_filters(request.args))
+
+    def generate():
+        with SessionLocal() as db:
+            result = db.execute(
+                select(Log.id, Log.time, Log.role, Log.action, Log.detail)
+                .where(*conds)
+                .order_by(Log.id.desc())
+                .execution_options(stream_results=True, yield_per=500)
+            )
+            if fmt == "csv":
+                buf = io.StringIO()
+                w = csv.writer(buf)
+                w.writerow(["id", "time", "role", "action", "detail"])
+                yield "\ufeff" + buf.getvalue()        # 엑셀 한글 깨짐 방지용 BOM
+                for row in result:
+                    buf.seek(0)
+                    buf.truncate()
+                    w.writerow([row.id, f"{row.time:06d}", row.role, row.action, row.detail])
+                    yield buf.getvalue()
+            else:
+                for row in result:
+                    yield json.dumps({
+                        "id": row.id, "time": f"{row.time:06d}", "role": row.role,
+                        "action": row.action, "detail": row.detail
+                    }, ensure_ascii=False) + "\n"
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(generate()),
+                    mimetype=f"{mimetype}; charset=utf-8",
+                    headers={"Content-Disposition": f"attachment; filename=logs.{fmt}"})
+
+# ─────────────────────────────────────────────────────────
+# 11-11) 매출 보고 (sales_ledger)
+# ─────────────────────────────────────────────────────────
+@app.route("/admin/sales")
+@login_required
+def admin_sales():
+    day = request.args.get("day") or business_day()
+    with SessionLocal() as db:
+        report = sales_report(db, day)
+        days = [d for (d,) in db.query(SalesLedger.businessDay).distinct()
+                                .order_by(SalesLedger.businessDay.desc()).limit(30)]
+    return render_template("admin_sales.html", report=report, days=days)
 
 # ─────────────────────────────────────────────────────────
 # 12) 주방 페이지
@@ -855,18 +2946,52 @@ def admin_log_page():
 @login_required
 def kitchen():
     with SessionLocal() as db:
-        paid_orders = db.query(Order).filter_by(status="paid").all()
-        item_count = {}
-        for o in paid_orders:
-            for it in o.items:
-                left = it.quantity - it.doneQuantity
-                if left > 0:
-                    item_count[it.menu.name] = item_count.get(it.menu.name, 0) + left
-    return render_template("kitchen.html", kitchen_status=item_count)
-
-@app.route("/kitchen/done-item/<menu_name>", methods=["POST"])
+        kitchen_status = [{
+            "menu_id": menu_id, "name": name, "left": left
+        } for menu_id, name, left in (
+            db.query(Menu.id, Menu.name, KitchenBacklog.outstanding)
+              .join(KitchenBacklog, KitchenBacklog.menu_id == Menu.id)
+              .filter(KitchenBacklog.outstanding > 0)
+              .order_by(Menu.id)
+        )]
+    # SSE 갱신: 조리 대기 수량 조각만 (static/js/app.js)
+    if request.args.get("part") == "backlog":
+        return render_template("kitchen_backlog.html", kitchen_status=kitchen_status)
+    return render_template("kitchen.html", kitchen_status=kitchen_status)
+
+def allocate_done(db, menu_id, count):
+    """
+    가장 오래된 paid 주문부터 menu_id 의 미조리 항목에 count 개를 배분.
+    대상 행만 잠그고 한 번에 갱신한다. 실제 배분된 수량을 반환.
+    """
+    rows = (db.query(OrderItem.id, OrderItem.order_id, OrderItem.quantity,
+                     OrderItem.doneQuantity)
+              .join(Order, Order.id == OrderItem.order_id)
+              .filter(OrderItem.menu_id == menu_id,
+                      Order.businessDay == business_day(),
+                      Order.status == "paid",
+                      OrderItem.quantity > OrderItem.doneQuantity)
+              .order_by(OrderItem.order_id, OrderItem.id)
+              .limit(count)     # 행마다 최소 1개는 남아 있으므로 count 행이면 충분
+              .with_for_update()
+              .all())
+
+    updates, remaining = [], count
+    for item_id, order_pk, quantity, done in rows:
+        delta = min(quantity - done, remaining)
+        updates.append({"id": item_id, "doneQuantity": done + delta})
+        emit_event(db, "ITEM_DONE", order_id=order_pk, businessDay=business_day(),
+                   item_id=item_id, menu_id=menu_id, quantity=delta)
+        remaining -= delta
+        if remaining == 0:
+            break
+    if updates:
+        db.execute(update(OrderItem), updates)
+    return count - remaining
+
+@app.route("/kitchen/done-item/<int:menu_id>", methods=["POST"])
 @login_required
-def kitchen_done_item(menu_name):
+def kitchen_done_item(menu_id):
     try:
         count = int(request.form.get("done_count", "0"))
     except ValueError:
@@ -875,35 +3000,438 @@ def kitchen_done_item(menu_name):
         flash("잘못된 조리 완료 수량입니다.", "error")
         return redirect(url_for("kitchen"))
 
+    menu_name = next((m.name for m in menu_cache.get() if m.id == menu_id), None)
+    if menu_name is None:
+        flash("해당 메뉴가 없습니다.", "error")
+        return redirect(url_for("kitchen"))
+
     with SessionLocal() as db:
         try:
-            orders = db.query(Order).filter_by(status="paid").order_by(Order.id.asc()).all()
-            remaining = count
-            for o in orders:
-                for it in o.items:
-                    if it.menu.name == menu_name and remaining > 0:
-                        todo = it.quantity - it.doneQuantity
-                        if todo > 0:
-                            delta = min(todo, remaining)
-                            it.doneQuantity += delta
-                            remaining -= delta
-                if remaining <= 0:
-                    break
+            allocated = allocate_done(db, menu_id, count)
+            log_action(session["role"], "KITCHEN_DONE_ITEM", f"{menu_name}/{allocated}", db=db)
             db.commit()
-            log_action(session["role"], "KITCHEN_DONE_ITEM", f"{menu_name}/{count}")
-            flash(f"[{menu_name}] {count}개 조리 완료 처리.")
+            project_now()
+            publish_event("kitchen", action="done", menu_id=menu_id, count=allocated)
+            if allocated < count:
+                flash(f"[{menu_name}] 남은 수량이 {allocated}개뿐이라 {allocated}개만 조리 완료 처리.")
+            else:
+                flash(f"[{menu_name}] {count}개 조리 완료 처리.")
         except:
             db.rollback()
             traceback.print_exc()
             flash("조리 완료 처리 중 오류가 발생했습니다.", "error")
     return redirect(url_for("kitchen"))
 
+# ─────────────────────────────────────────────────────────
+# 12-1) 실시간 이벤트 스트림
+# ─────────────────────────────────────────────────────────
+@app.route("/events")
+@login_required
+def events():
+    topics = {t for t in request.args.get("topics", "").split(",") if t}
+    q = broker.subscribe()
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    topic, data = q.get(timeout=SSE_KEEPALIVE_SEC)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if topics and topic not in topics:
+                    continue
+                yield f"event: {topic}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            broker.unsubscribe(q)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache",
+                             "X-Accel-Buffering": "no"})
+
+# ─────────────────────────────────────────────────────────
+# 12-2) JSON 조회 API (ETag / 304)
+#       ETag 는 모든 worker 가 같은 값을 보는 projection checkpoint 로 만든다
+#       (작은 표 한 번 읽기). 바뀐 게 없으면 본문 쿼리 없이 304 를 돌려준다.
+#       checkpoint 는 빈 id 를 건너뛰지 않으므로(_contiguous) 늦게 커밋된 작은 id 의
+#       이벤트도 ETag 를 바꾼다. checkpoint 를 먼저 읽고 본문을 나중에 만들므로
+#       본문이 ETag 보다 오래될 일은 없다. project_now() 를 부르지 않는 변경 경로는
+#       projector 가 따라잡을 때까지(PROJECTION_POLL_SEC) ETag 가 늦게 바뀐다.
+# ─────────────────────────────────────────────────────────
+def data_etag(prefix, projection=None):
+    """
+    projection 을 주면 그 checkpoint(파생 표가 반영한 마지막 이벤트),
+    아니면 모든 projection 이 빈틈없이 반영한 지점(가장 작은 checkpoint)을 버전으로 쓴다.
+    """
+    q = select(func.min(ProjectionCheckpoint.lastEventId))
+    if projection:
+        q = q.where(ProjectionCheckpoint.name == projection)
+    with engine.connect() as conn:
+        version = conn.execute(q).scalar()
+    return f"{prefix}-{business_day()}-{version or 0}"
+
+def conditional_json(etag, build):
+    """If-None-Match 가 etag 와 같으면 304, 아니면 build() 결과를 JSON 으로"""
+    if request.if_none_match.contains(etag):
+        res = Response(status=304)
+    else:
+        body = json.dumps(build(), ensure_ascii=False, separators=(",", ":"))
+        res = Response(body, mimetype="application/json")
+    res.set_etag(etag)
+    res.headers["Cache-Control"] = "private, no-cache"
+    return res
+
+@app.route("/api/orders")
+@login_required
+def api_orders():
+    statuses = [st for st in request.args.get("status", "pending,paid").split(",")
+                if st in ("pending", "paid")]
+
+    def build():
+        with SessionLocal() as db:
+            rows = (db.query(Order)
+                      .filter(Order.businessDay == business_day(),
+                              Order.status.in_(statuses))
+                      .options(selectinload(Order.items))
+                      .order_by(Order.id))
+            return {"orders": [{
+                "id": o.id, "order_id": o.order_id, "status": o.status,
+                "table": o.tableNumber, "people": o.peopleCount,
+                "total": o.totalPrice, "service": o.service,
+                "createdTs": o.createdTs, "confirmedTs": o.confirmedTs,
+                # [menu_id, 수량, 조리완료, 전달] — 메뉴 이름은 /api/menu 참고
+                "items": [[it.menu_id, it.quantity, it.doneQuantity, it.deliveredQuantity]
+                          for it in o.items],
+            } for o in rows]}
+
+    return conditional_json(data_etag("orders"), build)
+
+@app.route("/api/kitchen")
+@login_required
+def api_kitchen():
+    def build():
+        with SessionLocal() as db:
+            return {"backlog": [[menu_id, left] for menu_id, left in (
+                db.query(KitchenBacklog.menu_id, KitchenBacklog.outstanding)
+                  .filter(KitchenBacklog.outstanding > 0)
+                  .order_by(KitchenBacklog.menu_id)
+            )]}
+
+    return conditional_json(data_etag("kitchen", "kitchen_backlog"), build)
+
+@app.route("/api/tables")
+@login_required
+def api_tables():
+    def build():
+        # 이 worker 의 캐시는 아직 무효화 전일 수 있으므로 DB 에서 직접
+        s = _load_settings()
+        table_list = table_numbers(s.total_tables)
+        states = _load_tables()
+        # 경과 시간/색상은 usageStartTs 로 클라이언트가 계산 (시간이 흘러도 ETag 유지)
+        return {
+            "time_warning1": s.time_warning1, "time_warning2": s.time_warning2,
+            "tables": [{
+                "table": t,
+                "usageStartTs": states[t].usageStartTs if t in states else None,
+                "blocked": bool(states[t].blocked) if t in states else False,
+            } for t in table_list],
+        }
+
+    # checkpoint 는 관계없는 이벤트도 지나가므로 설정 변경(SETTINGS_UPDATED)에도 바뀐다
+    return conditional_json(data_etag("tables", "table_board"), build)
+
+@app.route("/api/menu")
+def api_menu():
+    def build():
+        return {"menu": [m._asdict() for m in _load_menu()]}
+
+    return conditional_json(data_etag("menu"), build)
+
+# ─────────────────────────────────────────────────────────
+# 12-3) 성능 지표 (Prometheus)
+# ─────────────────────────────────────────────────────────
+@app.route("/metrics")
+def metrics_page():
+    token = request.headers.get("Authorization", "")
+    if session.get("role") != "admin" and not (
+        METRICS_TOKEN and token == f"Bearer {METRICS_TOKEN}"
+    ):
+        return Response("forbidden\n", status=403, mimetype="text/plain")
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+# ─────────────────────────────────────────────────────────
+# 12-4) 정적 자산 (build_assets.py 결과물)
+#       템플릿은 asset_url("css/custom.css") 로 해시 URL 을 얻는다.
+#       빌드 전이면 원본 경로, vendor 파일이 없으면 CDN 주소로 대체.
+# ─────────────────────────────────────────────────────────
+STATIC_DIR  = os.path.join(app.root_path, "static")
+DIST_DIR    = os.path.join(STATIC_DIR, "dist")
+IMMUTABLE   = "public, max-age=31536000, immutable"
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+_asset_maps = None
+def asset_maps():
+    """(manifest, vendor CDN 표) — 프로세스당 한 번 읽는다"""
+    global _asset_maps
+    if _asset_maps is None:
+        _asset_maps = (_read_json(os.path.join(DIST_DIR, "manifest.json")),
+                       _read_json(os.path.join(STATIC_DIR, "vendor.json")))
+    return _asset_maps
+
+@app.template_global()
+def asset_url(filename):
+    manifest, cdn = asset_maps()
+    if filename in manifest:
+        return url_for("static", filename=manifest[filename])
+    if filename in cdn and not os.path.exists(os.path.join(STATIC_DIR, filename)):
+        return cdn[filename]
+    return url_for("static", filename=filename)
+
+@app.route("/static/dist/<path:filename>")
+def static_dist(filename):
+    """해시 이름 파일: 영구 캐시 + 사전 압축본(.br/.gz) 우선"""
+    accept = request.headers.get("Accept-Encoding", "")
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+        if enc in accept and os.path.isfile(os.path.join(DIST_DIR, filename + ext)):
+            res = send_from_directory(DIST_DIR, filename + ext, mimetype=mimetype,
+                                      max_age=31536000)
+            res.headers["Content-Encoding"] = enc
+            break
+    else:
+        res = send_from_directory(DIST_DIR, filename, mimetype=mimetype, max_age=31536000)
+    res.headers["Cache-Control"] = IMMUTABLE
+    res.headers["Vary"] = "Accept-Encoding"
+    return res
+
+# ─────────────────────────────────────────────────────────
+# 12-5) 관리 명령 (flask --app app <명령>)
+# ─────────────────────────────────────────────────────────
+@app.cli.command("rebuild-kitchen-backlog")
+def rebuild_kitchen_backlog_command():
+    """order_items 로부터 주방 미조리 집계를 재계산"""
+    with SessionLocal() as db:
+        mark_projected(db, "kitchen_backlog")
+        totals = rebuild_kitchen_backlog(db)
+        db.commit()
+    print(f"kitchen_backlog 재계산 완료: {len(totals)}개 메뉴, "
+          f"미조리 합계 {sum(totals.values())}")
+
+@app.cli.command("rebuild-sales-ledger")
+@click.option("--day", default=None, help="이 영업일(YYYY-MM-DD)만 재계산 (기본: 전체)")
+def rebuild_sales_ledger_command(day):
+    """주문으로부터 매출 원장을 재계산 (이벤트 도입 이전 영업일용)"""
+    with SessionLocal() as db:
+        project_events(db, ["sales_ledger"])    # 다른 영업일의 미반영 이벤트 먼저
+        mark_projected(db, "sales_ledger")
+        n = rebuild_sales_ledger(db, day)
+        db.commit()
+    print(f"sales_ledger 재계산 완료: {n}행")
+
+@app.cli.command("project-events")
+def project_events_command():
+    """checkpoint 이후의 order_events 를 projection 에 반영"""
+    with SessionLocal() as db:
+        ensure_checkpoints(db)
+        applied, _ = project_events(db)
+        db.commit()
+        rows = db.query(ProjectionCheckpoint).order_by(ProjectionCheckpoint.name).all()
+    print(f"{applied}건 반영: " + ", ".join(f"{cp.name}@{cp.lastEventId}" for cp in rows))
+
+@app.cli.command("rebuild-projections")
+@click.option("--name", "names", multiple=True,
+              type=click.Choice([p.name for p in PROJECTIONS]),
+              help="이 projection 만 (여러 번 지정 가능, 기본: 전체)")
+def rebuild_projections_command(names):
+    """projection 표를 비우고 order_events 를 처음부터 다시 반영"""
+    for p in PROJECTIONS:
+        if names and p.name not in names:
+            continue
+        t0 = time.perf_counter()
+        with SessionLocal() as db:
+            n = rebuild_projection(db, p.name)
+            db.commit()
+        print(f"{p.name}: 이벤트 {n}건 재반영 ({time.perf_counter() - t0:.2f}s)")
+    table_board.bump()
+    publish_event("table", action="rebuilt")
+
+@app.cli.command("order-events")
+@click.argument("order_pk", type=int)
+def order_events_command(order_pk):
+    """주문 하나의 이벤트 이력 출력 (orders.id 기준)"""
+    with SessionLocal() as db:
+        events = (db.query(OrderEvent).filter_by(order_id=order_pk)
+                    .order_by(OrderEvent.id).all())
+    if not events:
+        raise click.ClickException(f"이벤트 없음: 주문 {order_pk}")
+    names = {m.id: m.name for m in menu_cache.get()}
+    for ev in events:
+        what = names.get(ev.menu_id, "") if ev.menu_id else ""
+        print(f"#{ev.id:<8} {ev.businessDay} {ev.time:06d} {ev.type:<16} "
+              f"{ev.role or '':<8} {ev.tableNumber or '':<8} {what} "
+              f"{'' if ev.quantity is None else ev.quantity} "
+              f"{'' if ev.amount is None else ev.amount}".rstrip())
+
+@app.cli.command("set-menu-components")
+@click.argument("set_name")
+@click.argument("components", nargs=-1)
+def set_menu_components_command(set_name, components):
+    """세트 구성표 지정: flask set-menu-components "세트명" "구성메뉴명=수량" ..."""
+    with SessionLocal() as db:
+        set_menu = db.query(Menu).filter_by(name=set_name).first()
+        if not set_menu:
+            raise click.ClickException(f"메뉴 없음: {set_name}")
+        rows = []
+        for spec in components:
+            name, _, qty = spec.rpartition("=")
+            if not name or not qty.isdigit():
+                name, qty = spec, "1"
+            comp = db.query(Menu).filter_by(name=name).first()
+            if not comp:
+                raise click.ClickException(f"메뉴 없음: {name}")
+            rows.append(MenuComponent(set_menu_id=set_menu.id,
+                                      component_menu_id=comp.id, quantity=int(qty)))
+        db.query(MenuComponent).filter_by(set_menu_id=set_menu.id).delete()
+        db.add_all(rows)
+        db.commit()
+    print(f"[{set_name}] 구성품 {len(rows)}개 저장")
+
+def hot_queries():
+    """인덱스를 타야 하는 주요 쿼리 (check-indexes 에서 EXPLAIN)"""
+    return {
+        "status 별 주문": select(Order.id)
+            .where(Order.businessDay == "2025-01-01", Order.status == "paid")
+            .order_by(Order.id),
+        "테이블별 최근 최초주문": select(Order.tableNumber, func.max(Order.id))
+            .where(Order.tableNumber.in_(["1", "2"]), Order.peopleCount > 0)
+            .group_by(Order.tableNumber),
+        "주문 항목 로딩": select(OrderItem.id).where(OrderItem.order_id.in_([1, 2, 3])),
+        "조리완료 배분": select(OrderItem.id)
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(OrderItem.menu_id == 1, Order.businessDay == "2025-01-01",
+                   Order.status == "paid",
+                   OrderItem.quantity > OrderItem.doneQuantity)
+            .order_by(OrderItem.order_id, OrderItem.id).limit(5),
+        "메뉴명 조회": select(Menu.id).where(Menu.name == "x"),
+        "로그 action 필터": select(Log.id).where(Log.action == "CONFIRM_ORDER")
+            .order_by(Log.id.desc()).limit(LOG_PAGE_SIZE + 1),
+    }
+
+def explain_uses_index(conn, stmt):
+    """(인덱스 사용 여부, 실행계획 문자열)"""
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "mysql":
+        rows = conn.execute(text("EXPLAIN " + sql)).mappings().all()
+        # 후보 인덱스가 있어도 옵티마이저가 풀스캔(type=ALL)을 골랐으면 실패
+        ok = all(r["key"] and r["type"] != "ALL" for r in rows)
+        plan = "; ".join(f"{r['table']}:{r['type']}/{r['key']}" for r in rows)
+    else:
+        rows = [r[-1] for r in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+        ok = not any(d.startswith("SCAN") and "USING" not in d for d in rows)
+        plan = "; ".join(rows)
+    return ok, plan
+
+@app.cli.command("check-indexes")
+def check_indexes_command():
+    """주요 쿼리의 EXPLAIN 을 출력하고, 풀스캔이 있으면 종료코드 1"""
+    failed = False
+    with engine.connect() as conn:
+        for name, stmt in hot_queries().items():
+            ok, plan = explain_uses_index(conn, stmt)
+            failed |= not ok
+            print(f"[{'OK' if ok else 'SCAN'}] {name}: {plan}")
+    if failed:
+        raise SystemExit(1)
+
+def archive_closed_days(db, before=None):
+    """
+    before(기본: 현재 영업일) 이전 영업일의 주문·항목·로그를 *_archive 로 옮긴다.
+    INSERT … SELECT 후 DELETE 를 한 트랜잭션에서 수행 (커밋은 호출자가).
+    """
+    before = before or business_day()
+    old_ids = select(Order.id).where(Order.businessDay < before)
+
+    def move(src, dst, cond):
+        cols = [c.name for c in src.columns]
+        db.execute(insert(dst).from_select(cols, select(*src.columns).where(cond)))
+        return db.execute(delete(src).where(cond)).rowcount
+
+    counts = {
+        # 항목을 먼저 옮겨야 주문 id 서브쿼리가 유효하다
+        "order_items": move(OrderItem.__table__, order_items_archive,
+                            OrderItem.__table__.c.order_id.in_(old_ids)),
+        "orders": move(Order.__table__, orders_archive,
+                       Order.__table__.c.businessDay < before),
+        "logs": move(Log.__table__, logs_archive,
+                     Log.__table__.c.businessDay < before),
+    }
+    # order_events 는 보관하지 않는다 (감사 이력 / projection 재생용으로 계속 남김)
+    mark_projected(db, "kitchen_backlog")
+    rebuild_kitchen_backlog(db)
+    return counts
+
+@app.cli.command("archive-day")
+@click.option("--before", default=None, help="이 영업일(YYYY-MM-DD) 이전을 보관 (기본: 오늘)")
+def archive_day_command(before):
+    """마감된 영업일의 주문/로그를 보관 테이블로 이동"""
+    with SessionLocal() as db:
+        counts = archive_closed_days(db, before)
+        db.commit()
+    print("보관 완료: " + ", ".join(f"{k} {v}건" for k, v in counts.items()))
+
+@app.cli.command("migrate")
+def migrate_command():
+    """미적용 스키마 마이그레이션 적용"""
+    run_migrations()
+
 # ─────────────────────────────────────────────────────────
 # 13) 실행
+#     import 만으로는 DB 접속도, 쓰레드 시작도 하지 않는다.
+#       - 스키마/시드:  flask --app app init-db   (배포 때 한 번)
+#       - 운영:        gunicorn -c gunicorn.conf.py wsgi:app
+#                      (post_fork 훅에서 start_background_jobs)
+#       - 개발:        python app.py
 # ─────────────────────────────────────────────────────────
-init_db()
-start_time_checker()
+@app.cli.command("init-db")
+def init_db_command():
+    """테이블 생성, 마이그레이션, 기본 메뉴/설정 시드"""
+    init_db()
+    print("init-db 완료")
+
+def start_background_jobs():
+    """worker 프로세스에서 한 번 호출 (fork 이후여야 한다)"""
+    event_bus.start()
+    projector.start()
+    start_time_checker()
+
+_configured = False
+def create_app():
+    """
+    운영 설정을 적용한 app 을 반환. 라우트는 모듈 수준에서 이미 등록되어 있고,
+    여기서는 DB 나 쓰레드를 건드리지 않는다.
+    """
+    global _configured
+    if _configured:
+        return app
+    _configured = True
+    if not SECRET_KEY:
+        print("[warn] SECRET_KEY 가 없어 임시 키를 사용합니다. "
+              "worker 가 여러 개면 로그인 세션이 유지되지 않습니다.")
+    if JINJA_CACHE_DIR:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+    return app
 
 if __name__ == "__main__":
+    create_app()
+    init_db()
+    start_background_jobs()
     port = int(os.getenv("PORT", "5000"))
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+부하/데이터 규모 벤치마크
+
+로컬 DB(기본: 임시 SQLite 파일, 또는 --db 로 로컬 MySQL)에 app.py 를 띄우고
+데이터를 채운 뒤, 손님 주문 / 입금확인 / 주방 조리완료 / 전달 등을 섞어
+여러 쓰레드로 동시에 실행한다. 엔드포인트별 p50/p95/p99 지연, 처리량,
+요청당 SQL 문 수를 출력한다.
+
+    python bench.py --orders 3000 --logs 30000 --requests 2000 --concurrency 8
+    python bench.py --db "mysql+pymysql://user:pw@127.0.0.1/aif_bench" --json
+    python bench.py --cold-start 5     # wsgi import / 첫 요청까지 걸리는 시간
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from collections import defaultdict
+
+# 엔드포인트 이름, 가중치
+DEFAULT_MIX = {
+    "GET /order":          40,
+    "POST /order":         15,
+    "GET /admin":          10,
+    "POST /admin/confirm": 10,
+    "GET /kitchen":        10,
+    "POST /kitchen/done":  10,
+    "POST /admin/deliver":  5,
+    "POST /admin/deliver-table": 2,
+}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--db", help="SQLAlchemy URL (기본: 임시 SQLite 파일)")
+    p.add_argument("--tables", type=int, default=23)
+    p.add_argument("--orders", type=int, default=2000, help="미리 채울 주문 수")
+    p.add_argument("--logs", type=int, default=20000, help="미리 채울 로그 수")
+    p.add_argument("--requests", type=int, default=1000, help="총 요청 수")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--mix", help='가중치 JSON, 예: \'{"GET /order": 50, "GET /admin": 5}\'')
+    p.add_argument("--json", action="store_true", help="결과를 JSON 으로 출력")
+    p.add_argument("--cold-start", type=int, default=0, metavar="N",
+                   help="부하 대신 wsgi 콜드 스타트를 N 번 측정")
+    return p.parse_args()
+
+
+def percentile(sorted_values, q):
+    """nearest-rank 백분위수"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Bench:
+    def __init__(self, app_module, args):
+        self.A = app_module
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.local = threading.local()
+        self.samples = defaultdict(list)      # name -> [(sec, 쿼리수, status)]
+        self.samples_lock = threading.Lock()
+
+        from sqlalchemy import event
+
+        @event.listens_for(self.A.engine, "before_cursor_execute")
+        def _count(*_):
+            self.local.queries = getattr(self.local, "queries", 0) + 1
+
+    # ── 데이터 채우기 ─────────────────────────────────
+    def seed(self):
+        A, args = self.A, self.args
+        hhmmss, epoch, day = A.now_stamp()
+        with A.SessionLocal() as db:
+            db.query(A.Setting).filter_by(id=1).update({"total_tables": args.tables})
+            A.ensure_table_rows(db, args.tables)
+            menus = db.query(A.Menu).all()
+            for m in menus:
+                m.stock = 10 ** 6
+                m.sold_out = False
+            db.commit()
+
+            statuses = ["pending", "paid", "completed", "rejected"]
+            orders = [{
+                "order_id": f"{hhmmss:06d}", "tableNumber": str(i % args.tables + 1),
+                "peopleCount": 2 if i % 3 == 0 else 0, "phoneNumber": "",
+                "totalPrice": 20000, "status": statuses[i % 4],
+                "createdAt": hhmmss, "createdTs": epoch, "businessDay": day,
+                "confirmedAt": hhmmss if i % 4 in (1, 2) else None,
+                "confirmedTs": epoch if i % 4 in (1, 2) else None,
+                "alertTime1": 0, "alertTime2": 0, "service": False,
+            } for i in range(args.orders)]
+            if orders:
+                db.execute(A.insert(A.Order), orders)
+            ids = [oid for (oid,) in db.query(A.Order.id).order_by(A.Order.id)]
+            items = []
+            for n, oid in enumerate(ids):
+                for m in self.rng.sample(menus, 3):
+                    q = self.rng.randint(1, 3)
+                    done = q if n % 4 == 2 else self.rng.randint(0, q)
+                    items.append({"order_id": oid, "menu_id": m.id, "quantity": q,
+                                  "doneQuantity": done,
+                                  "deliveredQuantity": done if n % 4 == 2 else 0})
+            if items:
+                db.execute(A.insert(A.OrderItem), items)
+
+            logs = [{
+                "time": hhmmss, "ts": epoch, "businessDay": day,
+                "role": A.LOG_ROLES[i % len(A.LOG_ROLES)],
+                "action": A.LOG_ACTIONS[i % len(A.LOG_ACTIONS)],
+                "detail": f"bench {i}",
+            } for i in range(args.logs)]
+            for i in range(0, len(logs), 5000):
+                db.execute(A.insert(A.Log), logs[i:i + 5000])
+
+            A.rebuild_kitchen_backlog(db)
+            A.rebuild_sales_ledger(db, day)
+            db.commit()
+        A.menu_cache.bump()
+        A.settings_cache.bump()
+        A.table_board.bump()
+        self.menus = [m for m in A.menu_cache.get()]
+
+    # ── 시나리오 ──────────────────────────────────────
+    def client(self, role=None):
+        c = self.A.app.test_client()
+        if role:
+            with c.session_transaction() as s:
+                s["role"] = role
+        return c
+
+    def pick(self, seq):
+        with self.rng_lock:
+            return self.rng.choice(seq) if seq else None
+
+    def pick_order(self, status):
+        A = self.A
+        with A.SessionLocal() as db:
+            ids = [i for (i,) in db.query(A.Order.id)
+                   .filter(A.Order.status == status)
+                   .order_by(A.Order.id.desc()).limit(50)]
+        return self.pick(ids)
+
+    def prepare(self, name):
+        """요청에 필요한 대상 선택 (측정 밖). (method, url, form) 반환"""
+        A = self.A
+        if name == "GET /order":
+            return "GET", "/order", None
+        if name == "POST /order":
+            with self.rng_lock:
+                table = str(self.rng.randint(1, self.args.tables))
+                picks = self.rng.sample(self.menus, 2)
+            form = {"tableNumber": table, "isFirstOrder": "false", "peopleCount": "0"}
+            for m in picks:
+                form[f"qty_{m.id}"] = "1"
+            return "POST", "/order", form
+        if name == "GET /admin":
+            return "GET", "/admin", None
+        if name == "POST /admin/confirm":
+            oid = self.pick_order("pending")
+            return ("POST", f"/admin/confirm/{oid}", {}) if oid else None
+        if name == "GET /kitchen":
+            return "GET", "/kitchen", None
+        if name == "POST /kitchen/done":
+            m = self.pick(self.menus)
+            return "POST", f"/kitchen/done-item/{m.id}", {"done_count": "1"}
+        if name == "POST /admin/deliver":
+            with A.SessionLocal() as db:
+                item_id = (db.query(A.OrderItem.id)
+                             .join(A.Order, A.Order.id == A.OrderItem.order_id)
+                             .filter(A.Order.status == "paid",
+                                     A.OrderItem.doneQuantity > A.OrderItem.deliveredQuantity)
+                             .limit(1).scalar())
+            if not item_id:
+                return None
+            return "POST", f"/admin/deliver_item/{item_id}", {"deliver_count": "1"}
+        if name == "POST /admin/deliver-table":
+            with A.SessionLocal() as db:
+                table = (db.query(A.Order.tableNumber)
+                           .join(A.OrderItem, A.OrderItem.order_id == A.Order.id)
+                           .filter(A.Order.status == "paid",
+                                   A.OrderItem.doneQuantity > A.OrderItem.deliveredQuantity)
+                           .limit(1).scalar())
+            if not table:
+                return None
+            return "POST", f"/admin/deliver_table/{table}", {}
+        raise ValueError(name)
+
+    def worker(self, jobs):
+        clients = {"customer": self.client(), "staff": self.client("admin")}
+        for name in jobs:
+            req = self.prepare(name)
+            if req is None:
+                continue
+            method, url, form = req
+            c = clients["customer"] if name.endswith("/order") else clients["staff"]
+            self.local.queries = 0
+            t0 = time.perf_counter()
+            res = c.open(url, method=method, data=form)
+            res.get_data()
+            elapsed = time.perf_counter() - t0
+            with self.samples_lock:
+                self.samples[name].append((elapsed, self.local.queries, res.status_code))
+
+    def run(self, mix):
+        names, weights = zip(*mix.items())
+        jobs = self.rng.choices(names, weights=weights, k=self.args.requests)
+        n = self.args.concurrency
+        threads = [threading.Thread(target=self.worker, args=(jobs[i::n],)) for i in range(n)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - t0
+
+    def report(self, wall):
+        rows = []
+        total = 0
+        for name in sorted(self.samples):
+            s = self.samples[name]
+            lat = sorted(x[0] * 1000 for x in s)
+            total += len(s)
+            rows.append({
+                "endpoint": name,
+                "count": len(s),
+                "p50_ms": round(percentile(lat, 50), 2),
+                "p95_ms": round(percentile(lat, 95), 2),
+                "p99_ms": round(percentile(lat, 99), 2),
+                "queries_avg": round(sum(x[1] for x in s) / len(s), 1),
+                "queries_max": max(x[1] for x in s),
+                "errors": sum(1 for x in s if x[2] >= 500),
+            })
+        return {"wall_sec": round(wall, 2),
+                "throughput_rps": round(total / wall, 1) if wall else 0,
+                "requests": total,
+                "endpoints": rows}
+
+
+def print_report(r, args):
+    print(f"\n데이터: tables={args.tables} orders={args.orders} logs={args.logs}  "
+          f"동시성={args.concurrency}")
+    print(f"{'endpoint':<28}{'count':>7}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}"
+          f"{'q/avg':>7}{'q/max':>7}{'5xx':>5}")
+    for row in r["endpoints"]:
+        print(f"{row['endpoint']:<28}{row['count']:>7}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+              f"{row['p99_ms']:>9}{row['queries_avg']:>7}{row['queries_max']:>7}{row['errors']:>5}")
+    print(f"\n총 {r['requests']}건 / {r['wall_sec']}s → {r['throughput_rps']} req/s")
+
+
+# 새 프로세스에서 wsgi 를 import 하고 첫 요청을 처리하기까지.
+# import 중 DB 커넥션을 열거나 쓰레드를 띄우면 side_effects 에 기록된다.
+COLD_START_PROBE = r"""
+import json, threading, time
+t0 = time.perf_counter()
+import wsgi
+import app as A
+t1 = time.perf_counter()
+side_effects = []
+if A.engine.pool.checkedin() or A.engine.pool.checkedout():
+    side_effects.append("db connection")
+if threading.active_count() > 1:
+    side_effects.append(f"{threading.active_count() - 1} thread(s)")
+res = wsgi.app.test_client().get("/order")
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000,
+                  "status": res.status_code, "side_effects": side_effects}))
+"""
+
+
+def measure_cold_start(runs):
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", COLD_START_PROBE], cwd=here,
+                             env=os.environ.copy(), capture_output=True, text=True,
+                             check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    imp = sorted(x["import_ms"] for x in samples)
+    first = sorted(x["first_request_ms"] for x in samples)
+    return {
+        "runs": runs,
+        "import_ms_min": round(imp[0], 1),
+        "import_ms_median": round(statistics.median(imp), 1),
+        "first_request_ms_median": round(statistics.median(first), 1),
+        "statuses": sorted({x["status"] for x in samples}),
+        "side_effects": sorted({e for x in samples for e in x["side_effects"]}),
+    }
+
+
+def main():
+    args = parse_args()
+    tmpdir = None
+    if args.db:
+        os.environ["DATABASE_URL"] = args.db
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="aif-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    for key in ("ADMIN_ID", "ADMIN_PW", "KITCHEN_ID", "KITCHEN_PW"):
+        os.environ.setdefault(key, "bench")
+    # 소수의 테이블로 주문을 몰아 넣으므로 테이블별 유입 제한은 풀어 둔다
+    os.environ.setdefault("ORDER_BURST", "1000000")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    app_module.init_db()
+
+    if args.cold_start:
+        result = measure_cold_start(args.cold_start)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            print(f"콜드 스타트 {result['runs']}회: import 최소 {result['import_ms_min']}ms / "
+                  f"중앙 {result['import_ms_median']}ms, 첫 요청 중앙 "
+                  f"{result['first_request_ms_median']}ms, 상태 {result['statuses']}")
+            print("import 부수효과: " + (", ".join(result["side_effects"]) or "없음"))
+        return
+
+    app_module.start_time_checker()
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    bench = Bench(app_module, args)
+    t0 = time.perf_counter()
+    bench.seed()
+    seed_sec = time.perf_counter() - t0
+
+    wall = bench.run(mix)
+    result = bench.report(wall)
+    result["seed_sec"] = round(seed_sec, 2)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(f"데이터 준비: {seed_sec:.2f}s")
+        print_report(result, args)
+
+
+if __name__ == "__main__":
+    main()
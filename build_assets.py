@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+정적 자산 빌드
+
+1) static/vendor.json 에 적힌 CDN 파일(Bootstrap, FontAwesome)을 static/vendor/ 로 내려받고
+2) static/ 아래 파일을 내용 해시가 붙은 이름으로 static/dist/ 에 복사한 뒤
+   (CSS 안의 url(...) 도 해시 이름으로 바꾼다)
+3) .gz / .br(brotli 모듈이 있을 때) 사전 압축본과 manifest.json 을 만든다.
+
+app.py 의 asset_url() 이 manifest 를 읽어 해시 URL 을 만들고,
+/static/dist/ 는 immutable 캐시 헤더로 제공된다.
+
+    python build_assets.py             # 배포 전에 한 번
+    python build_assets.py --offline   # 내려받기 생략 (이미 vendor/ 가 있을 때)
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+import posixpath
+import urllib.request
+
+try:
+    import brotli
+except ImportError:     # 선택 의존성: 없으면 gzip 만 만든다
+    brotli = None
+
+ROOT       = os.path.dirname(os.path.abspath(__file__))
+STATIC     = os.path.join(ROOT, "static")
+DIST       = os.path.join(STATIC, "dist")
+VENDOR_MAP = os.path.join(STATIC, "vendor.json")
+MANIFEST   = os.path.join(DIST, "manifest.json")
+
+HASH_LEN = 10
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".ttf", ".txt")
+MIN_COMPRESS_BYTES = 1024
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--offline", action="store_true", help="vendor 파일을 내려받지 않음")
+    return p.parse_args()
+
+
+def vendor(offline):
+    """vendor.json 의 파일 중 없는 것만 내려받는다"""
+    with open(VENDOR_MAP, encoding="utf-8") as f:
+        assets = json.load(f)
+    missing = []
+    for rel, url in assets.items():
+        dst = os.path.join(STATIC, rel)
+        if os.path.exists(dst):
+            continue
+        if offline:
+            missing.append(rel)
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        print(f"[vendor] {url}")
+        with urllib.request.urlopen(url, timeout=30) as res, open(dst + ".part", "wb") as out:
+            shutil.copyfileobj(res, out)
+        os.replace(dst + ".part", dst)
+    return missing
+
+
+def source_files():
+    """static/ 아래 빌드 대상 (dist/ 와 vendor.json 제외), 논리 경로는 '/' 구분"""
+    for dirpath, dirnames, filenames in os.walk(STATIC):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != DIST]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, STATIC).replace(os.sep, "/")
+            if rel != "vendor.json" and not name.endswith(".part"):
+                yield rel
+
+
+def hashed_name(rel, data):
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+    base, ext = posixpath.splitext(rel)
+    return f"{base}.{digest}{ext}"
+
+
+def rewrite_css(rel, css, manifest):
+    """CSS 안의 상대 url() 을 해시 이름으로 (쿼리/프래그먼트는 유지)"""
+    here = posixpath.dirname(rel)
+
+    def sub(m):
+        quote, url = m.group(1), m.group(2)
+        if url.startswith(("data:", "http:", "https:", "/", "#")):
+            return m.group(0)
+        path, tail = re.match(r"([^?#]*)(.*)", url).groups()
+        target = posixpath.normpath(posixpath.join(here, path))
+        if target not in manifest:
+            return m.group(0)
+        new = posixpath.relpath(manifest[target], posixpath.join("dist", here))
+        return f"url({quote}{new}{tail}{quote})"
+
+    return CSS_URL.sub(sub, css)
+
+
+def compress(path, data):
+    if not path.endswith(COMPRESSIBLE) or len(data) < MIN_COMPRESS_BYTES:
+        return []
+    out = []
+    with open(path + ".gz", "wb") as f:
+        # mtime 고정: 같은 입력이면 같은 출력
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    out.append(".gz")
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+        out.append(".br")
+    return out
+
+
+def build():
+    if os.path.isdir(DIST):
+        shutil.rmtree(DIST)
+    os.makedirs(DIST)
+
+    files = sorted(source_files())
+    # CSS 가 참조하는 글꼴/이미지의 해시가 먼저 정해져야 하므로 CSS 는 마지막에
+    files.sort(key=lambda rel: rel.endswith(".css"))
+    manifest, encodings = {}, {}
+    for rel in files:
+        with open(os.path.join(STATIC, rel), "rb") as f:
+            data = f.read()
+        if rel.endswith(".css"):
+            data = rewrite_css(rel, data.decode("utf-8"), manifest).encode("utf-8")
+        out_rel = "dist/" + hashed_name(rel, data)
+        out_path = os.path.join(STATIC, *out_rel.split("/"))
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, "wb") as f:
+            f.write(data)
+        manifest[rel] = out_rel
+        encodings[rel] = compress(out_path, data)
+
+    with open(MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return manifest, encodings
+
+
+def main():
+    args = parse_args()
+    missing = vendor(args.offline)
+    manifest, encodings = build()
+    for rel in sorted(manifest):
+        print(f"{rel:<50} → {manifest[rel]}  {' '.join(encodings[rel])}")
+    if missing:
+        print("\n[warn] 내려받지 않은 vendor 파일 (CDN 으로 대체됨): " + ", ".join(missing))
+    if brotli is None:
+        print("[info] brotli 모듈이 없어 .br 은 만들지 않았습니다 (pip install brotli).")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
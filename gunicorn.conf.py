@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 설정 (gunicorn -c gunicorn.conf.py wsgi:app)
+
+preload_app 으로 master 에서 app 을 한 번만 import 하고, 백그라운드 작업
+(50/60분 알림 스케줄러 등)은 fork 이후 각 worker 의 post_fork 에서 시작한다.
+알림 처리는 DB lease 를 잡은 worker 하나만 수행한다.
+"""
+
+import os
+
+# worker 가 여럿이므로 캐시 무효화/SSE 이벤트는 프로세스 밖으로 전달해야 한다.
+# (Redis 가 있으면 EVENT_BUS=redis://... 로 덮어쓴다)
+os.environ.setdefault("EVENT_BUS", "db")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))   # SSE 연결이 쓰레드를 하나씩 점유
+timeout = 60
+graceful_timeout = 20
+preload_app = True
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    import app as app_module
+
+    # master 에서 혹시 열렸을 커넥션을 자식이 공유하지 않도록
+    app_module.engine.dispose(close=False)
+    app_module.start_background_jobs()
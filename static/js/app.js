@@ -16,3 +16,111 @@ document.addEventListener('DOMContentLoaded', () => {
     }, delayBeforeShow);
   });
 });
+
+// ── 실시간 갱신 ───────────────────────────────────────
+// live-region 안의 data-live-part 조각마다 관심 토픽(data-live-topics)이 있다.
+// /events(SSE) 이벤트를 받으면 그 토픽의 조각만 ?part=<이름> 으로 다시 받아 교체한다.
+// 조각마다 첫 이벤트부터 data-live-delay(ms) 동안 이벤트를 모아 한 번만 요청한다
+// (주문이 몰려도 조각당 delay 에 한 번).
+// 스트림이 끊겨 있는 동안에만 60초 간격 폴링으로 대신한다.
+document.addEventListener('DOMContentLoaded', () => {
+  const region = document.querySelector('#live-region[data-live-url]');
+  if (!region) return;
+  const parts = [].slice.call(region.querySelectorAll('[data-live-part]'));
+
+  const POLL_INTERVAL = 60000;
+  const DEFAULT_DELAY = 2000;
+  let pollTimer = null;
+  const timers = new Map();  // 조각 → 예약된 갱신 타이머
+
+  const delayOf = (part) => parseInt(part.dataset.liveDelay, 10) || DEFAULT_DELAY;
+
+  // 입력 중이거나 값을 바꿔 둔 폼이 있으면 그 조각은 갱신을 미룬다
+  const isEditing = (part) => {
+    const el = document.activeElement;
+    if (el && part.contains(el) && ['INPUT', 'SELECT', 'TEXTAREA'].includes(el.tagName)) {
+      return true;
+    }
+    return [].slice.call(part.querySelectorAll('input, select, textarea')).some(f => {
+      if (f.type === 'checkbox' || f.type === 'radio') return f.checked !== f.defaultChecked;
+      if (f.tagName === 'SELECT') return [].slice.call(f.options).some(o => o.selected !== o.defaultSelected);
+      if (f.type === 'hidden') return false;
+      if (f.type === 'file') return f.value !== '';
+      return f.value !== f.defaultValue;
+    });
+  };
+
+  const partUrl = (name) => {
+    const url = new URL(location.href);
+    url.searchParams.set('part', name);
+    return url;
+  };
+
+  function refresh(part) {
+    timers.delete(part);
+    if (isEditing(part)) {
+      schedule(part);
+      return;
+    }
+    fetch(partUrl(part.dataset.livePart), { credentials: 'same-origin' })
+      .then(res => res.ok ? res.text() : Promise.reject(res.status))
+      .then(html => {
+        // 펼쳐 둔 <details> 는 교체 후에도 펼친 채로
+        const open = [].slice.call(part.querySelectorAll('details')).map(d => d.open);
+        part.innerHTML = html;
+        part.querySelectorAll('details').forEach((d, i) => { if (open[i]) d.open = true; });
+      })
+      .catch(() => {});
+  }
+
+  // 이미 예약돼 있으면 그대로 둔다 (타이머를 미루지 않으므로 이벤트가 계속 와도 굶지 않음)
+  function schedule(part) {
+    if (timers.has(part)) return;
+    timers.set(part, setTimeout(() => refresh(part), delayOf(part)));
+  }
+
+  if (!window.EventSource) {
+    setInterval(() => parts.forEach(refresh), POLL_INTERVAL);
+    return;
+  }
+
+  const partsFor = (topic) =>
+    parts.filter(part => part.dataset.liveTopics.split(',').includes(topic));
+
+  const source = new EventSource(region.dataset.liveUrl);
+  region.dataset.liveTopics.split(',').forEach(topic => {
+    source.addEventListener(topic, () => partsFor(topic).forEach(schedule));
+  });
+  source.addEventListener('open', () => {
+    if (pollTimer) {
+      clearInterval(pollTimer);
+      pollTimer = null;
+      parts.forEach(schedule);  // 끊겨 있던 동안의 변경 반영
+    }
+  });
+  source.addEventListener('error', () => {
+    if (!pollTimer) pollTimer = setInterval(() => parts.forEach(schedule), POLL_INTERVAL);
+  });
+});
+
+// ── "더 보기" 조각 불러오기 ───────────────────────────
+// data-more-url 버튼을 누르면 다음 페이지 조각을 받아 버튼 자리에 끼워 넣는다.
+// (조각이 교체되어도 동작하도록 document 에 위임)
+document.addEventListener('click', (e) => {
+  const btn = e.target.closest('[data-more-url]');
+  if (!btn) return;
+  btn.disabled = true;
+  fetch(btn.dataset.moreUrl, { credentials: 'same-origin' })
+    .then(res => res.ok ? res.text() : Promise.reject(res.status))
+    .then(html => btn.closest('li').outerHTML = html)
+    .catch(() => { btn.disabled = false; });
+});
+
+// ── 전체 선택 체크박스 ────────────────────────────────
+// data-check-all="이름" 체크박스가 같은 name 의 체크박스를 모두 토글한다.
+document.addEventListener('change', (e) => {
+  const name = e.target.dataset && e.target.dataset.checkAll;
+  if (!name) return;
+  document.querySelectorAll(`input[type=checkbox][name="${name}"]`)
+    .forEach(cb => { cb.checked = e.target.checked; });
+});
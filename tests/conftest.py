@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+테스트 공통 준비: 임시 SQLite DB 를 쓰도록 환경변수를 맞춘 뒤 app 을 import 한다.
+(app 은 import 시점에 DATABASE_URL 로 engine 을 만든다)
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_DB_DIR = tempfile.mkdtemp(prefix="aif-test-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_DB_DIR, "test.db")
+os.environ.setdefault("ADMIN_ID", "admin")
+os.environ.setdefault("ADMIN_PW", "admin")
+os.environ.setdefault("KITCHEN_ID", "kitchen")
+os.environ.setdefault("KITCHEN_PW", "kitchen")
+os.environ.setdefault("EVENT_BUS", "local")
+
+
+@pytest.fixture(scope="session")
+def A():
+    """init_db() 까지 끝난 app 모듈"""
+    import app
+    app.init_db()
+    return app
+
+
+@pytest.fixture
+def db(A):
+    """주문/항목을 비운 세션 (테스트끼리 서로 영향이 없도록)"""
+    with A.SessionLocal() as session:
+        session.query(A.OrderItem).delete()
+        session.query(A.Order).delete()
+        session.commit()
+        yield session
+
+
+@pytest.fixture
+def count_sql(A):
+    """with count_sql() as stmts: ... 블록 안에서 실행된 SQL 문 목록"""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+
+    @contextmanager
+    def counter():
+        stmts = []
+
+        def listener(conn, cursor, statement, *args):
+            stmts.append(statement)
+
+        event.listen(A.engine, "before_cursor_execute", listener)
+        try:
+            yield stmts
+        finally:
+            event.remove(A.engine, "before_cursor_execute", listener)
+
+    return counter
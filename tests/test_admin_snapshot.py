@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""관리자 대시보드 스냅샷의 쿼리 수가 주문 수와 무관하게 고정인지"""
+import itertools
+
+
+def seed_orders(A, db, n):
+    hhmmss, epoch, day = A.now_stamp()
+    menus = [m.id for m in db.query(A.Menu.id).order_by(A.Menu.id)]
+    statuses = itertools.cycle(["pending", "paid", "completed", "rejected"])
+    for i in range(n):
+        status = next(statuses)
+        o = A.Order(order_id=f"{i:06d}", tableNumber=str(i % 20 + 1),
+                    peopleCount=2 if i % 3 == 0 else 0, totalPrice=10000,
+                    status=status, createdAt=hhmmss, createdTs=epoch,
+                    confirmedAt=hhmmss if status != "pending" else None,
+                    confirmedTs=epoch if status != "pending" else None,
+                    businessDay=day)
+        db.add(o)
+        db.flush()
+        for menu_id in menus[i % 3: i % 3 + 3]:
+            db.add(A.OrderItem(order_id=o.id, menu_id=menu_id, quantity=2,
+                               doneQuantity=1 if status == "paid" else 0,
+                               deliveredQuantity=0))
+    db.commit()
+
+
+def snapshot_statements(A, count_sql):
+    A.table_board.get()         # 캐시 적재는 스냅샷 쿼리에 넣지 않는다
+    A.menu_cache.get()
+    with A.SessionLocal() as session, count_sql() as stmts:
+        snap = A.build_admin_snapshot(session)
+    return snap, len(stmts)
+
+
+def test_query_count_is_independent_of_order_count(A, db, count_sql):
+    seed_orders(A, db, 4)
+    small, small_count = snapshot_statements(A, count_sql)
+
+    seed_orders(A, db, 200)
+    large, large_count = snapshot_statements(A, count_sql)
+
+    assert len(large["pending_orders"]) > len(small["pending_orders"])
+    assert small_count == large_count, (small_count, large_count)
+    assert large_count <= A.ADMIN_SNAPSHOT_QUERY_BUDGET
+
+
+def test_admin_page_renders_within_budget(A, db, count_sql):
+    seed_orders(A, db, 40)
+    client = A.app.test_client()
+    with client.session_transaction() as s:
+        s["role"] = "admin"
+    A.table_board.get()
+    A.menu_cache.get()
+    with count_sql() as stmts:
+        res = client.get("/admin")
+    assert res.status_code == 200
+    assert len(stmts) <= A.ADMIN_SNAPSHOT_QUERY_BUDGET
+
+
+def test_live_parts_render_alone_with_fewer_queries(A, db, count_sql):
+    seed_orders(A, db, 40)
+    client = A.app.test_client()
+    with client.session_transaction() as s:
+        s["role"] = "admin"
+    A.table_board.get()
+    A.menu_cache.get()
+    full = client.get("/admin").get_data(as_text=True)
+
+    for part in A.ADMIN_PARTS:
+        with count_sql() as stmts:
+            res = client.get(f"/admin?part={part}")
+        assert res.status_code == 200
+        assert "<html" not in res.get_data(as_text=True)
+        assert len(stmts) < A.ADMIN_SNAPSHOT_QUERY_BUDGET, (part, len(stmts))
+    assert 'data-live-part="orders"' in full
+    assert client.get("/admin?part=nope").status_code == 404
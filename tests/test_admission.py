@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""주문 제출 유입 제어: bucket 키와 bucket 수 상한"""
+import time
+
+
+def test_takeout_is_keyed_by_phone_and_unknown_tables_are_ignored(A):
+    assert A.admission_key({"tableNumber": "1"}) == "1"
+    assert A.admission_key({"tableNumber": "TAKEOUT",
+                            "phoneNumber": "010-1234-5678"}) == "TAKEOUT:01012345678"
+    assert A.admission_key({"tableNumber": "TAKEOUT"}) is None
+    assert A.admission_key({"tableNumber": "no-such-table"}) is None
+
+
+def test_buckets_are_bounded(A):
+    buckets = A.TokenBuckets(1, 0.001)
+    buckets.MAX_KEYS = 5
+    for i in range(50):
+        buckets.take(f"k{i}")
+        time.sleep(0.002)
+    assert len(buckets._buckets) <= 5
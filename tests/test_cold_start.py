@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""wsgi import 가 DB 접속/쓰레드 없이 빠르게 끝나는지 (bench.py --cold-start 와 같은 probe)"""
+import json
+import os
+import subprocess
+import sys
+
+from bench import COLD_START_PROBE
+
+IMPORT_MS_LIMIT = 3000      # 느린 CI 에서도 넘지 않을 정도의 상한
+
+
+def test_wsgi_import_has_no_side_effects(A):
+    root = os.path.dirname(os.path.abspath(A.__file__))
+    out = subprocess.run([sys.executable, "-c", COLD_START_PROBE], cwd=root,
+                         env=os.environ.copy(), capture_output=True, text=True,
+                         check=True, timeout=60).stdout
+    probe = json.loads(out.strip().splitlines()[-1])
+
+    assert probe["side_effects"] == []
+    assert probe["status"] == 200
+    assert probe["import_ms"] < IMPORT_MS_LIMIT, probe
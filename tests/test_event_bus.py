@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""worker 간 이벤트 버스: 다른 worker 캐시 무효화와 outbox 폴링 순서"""
+import time
+
+from sqlalchemy import delete, insert
+
+
+def test_outbox_poll_holds_at_uncommitted_gap(A):
+    backend = A.DbPollBackend(poll_sec=0)
+    now = int(time.time())
+    with A.engine.begin() as conn:
+        conn.execute(delete(A.EventOutbox))
+        conn.execute(insert(A.EventOutbox), [
+            {"id": 1, "ts": now, "payload": "a"},
+            {"id": 3, "ts": now, "payload": "c"},     # 2 는 아직 커밋 전
+        ])
+    with A.engine.connect() as conn:
+        assert [r.id for r in backend._fetch(conn, 0)] == [1]
+        assert backend._fetch(conn, 1) == []
+
+    with A.engine.begin() as conn:
+        conn.execute(insert(A.EventOutbox).values(id=2, ts=now, payload="b"))
+    with A.engine.connect() as conn:
+        assert [r.payload for r in backend._fetch(conn, 1)] == ["b", "c"]
+
+    # 오래 안 채워진 빈 id 는 롤백된 것으로 보고 넘어간다
+    with A.engine.begin() as conn:
+        conn.execute(insert(A.EventOutbox).values(
+            id=5, ts=now - A.PROJECTION_GAP_SEC - 1, payload="e"))
+    with A.engine.connect() as conn:
+        assert [r.id for r in backend._fetch(conn, 3)] == [5]
+
+
+class FakeBroker:
+    """SSE fan-out 대신 받은 (topic, data) 를 모아 둔다"""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, data):
+        self.published.append((topic, data))
+
+
+def test_bus_invalidates_other_worker_and_ignores_own(A):
+    backend = A.LocalBackend()      # 두 worker 가 공유하는 in-process fake
+    sse_a, sse_b = FakeBroker(), FakeBroker()
+    bus_a, bus_b = A.EventBus(backend, sse_a), A.EventBus(backend, sse_b)
+    bus_a.start()
+    bus_b.start()
+    assert bus_a.origin != bus_b.origin
+    caches = {"menu": A.menu_cache, "settings": A.settings_cache, "table": A.table_board}
+
+    for topic, bumped in [("stock", {"menu"}), ("settings", {"settings", "table"}),
+                          ("table", {"table"})]:
+        before = {name: c.version for name, c in caches.items()}
+        bus_a.publish(topic, {"action": "test"})
+        # 캐시는 전역이므로 B 가 받아서 한 번 bump 한 것만 보여야 한다 (A 는 자기 것 무시)
+        assert {name: c.version - before[name] for name, c in caches.items()} == \
+            {name: 1 if name in bumped else 0 for name in caches}
+
+    assert [t for t, _ in sse_a.published] == ["stock", "settings", "table"]
+    assert [t for t, _ in sse_b.published] == ["stock", "settings", "table"]
+
+    before = A.menu_cache.version
+    bus_b.publish("stock", {"action": "test"})
+    assert A.menu_cache.version == before + 1
+    assert len(sse_a.published) == 4 and len(sse_b.published) == 4
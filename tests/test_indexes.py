@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""주요 쿼리가 인덱스를 타는지 (check-indexes 명령과 같은 EXPLAIN 판정)"""
+from sqlalchemy import select
+
+
+def test_hot_queries_use_indexes(A):
+    with A.engine.connect() as conn:
+        plans = {name: A.explain_uses_index(conn, stmt)
+                 for name, stmt in A.hot_queries().items()}
+    full_scans = {name: plan for name, (ok, plan) in plans.items() if not ok}
+    assert not full_scans
+
+
+def test_explain_flags_full_scan(A):
+    with A.engine.connect() as conn:
+        ok, plan = A.explain_uses_index(conn, select(A.Order.id)
+                                        .where(A.Order.phoneNumber == "010"))
+    assert not ok, plan
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""order_events → projection: 실시간 반영과 처음부터 재생한 결과가 같은지"""
+import datetime
+from types import SimpleNamespace
+
+
+class Tomorrow(datetime.datetime):
+    """now() 만 하루 뒤 (영업일 경계 재현)"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.datetime.now(tz) + datetime.timedelta(days=1)
+
+
+def admin_client(A):
+    client = A.app.test_client()
+    with client.session_transaction() as s:
+        s["role"] = "admin"
+    return client
+
+
+def table_state(A):
+    with A.SessionLocal() as db:
+        return {t.tableNumber: (t.usageStart is not None, bool(t.blocked))
+                for t in db.query(A.TableState)}
+
+
+def test_block_toggle_is_serialized_before_projection(A, monkeypatch):
+    client = admin_client(A)
+    before = table_state(A)["7"][1]
+    monkeypatch.setattr(A, "project_now", lambda: set())     # projection 지연
+    client.post("/admin/block_table/7")
+    client.post("/admin/block_table/7")
+    assert table_state(A)["7"][1] == before
+    monkeypatch.undo()
+    A.project_now()
+    assert table_state(A)["7"][1] == before
+
+
+def rebuild_all(A):
+    with A.SessionLocal() as s:
+        for p in A.PROJECTIONS:
+            A.rebuild_projection(s, p.name)
+        s.commit()
+
+
+def test_rebuild_matches_live_projection(A, db, monkeypatch):
+    menus = A.menu_cache.get()
+    main, side = menus[1], menus[3]
+    customer = A.app.test_client()
+    customer.post("/order", data={
+        "tableNumber": "3", "isFirstOrder": "true", "peopleCount": "2",
+        "noticeChecked": "on", f"qty_{main.id}": "2", f"qty_{side.id}": "1",
+    })
+    order_pk = db.query(A.Order.id).order_by(A.Order.id.desc()).limit(1).scalar()
+
+    client = admin_client(A)
+    client.post(f"/admin/confirm/{order_pk}")
+    client.post(f"/kitchen/done-item/{main.id}", data={"done_count": "1"})
+    client.post("/admin/block_table/9")
+    client.post("/admin/service", data={"serviceTable": "3",
+                                        "serviceMenu": side.name, "serviceQty": "1"})
+    client.post(f"/admin/complete/{order_pk}")
+    A.project_now()
+
+    def views():
+        with A.SessionLocal() as s:
+            return (
+                {k.menu_id: k.outstanding for k in s.query(A.KitchenBacklog)},
+                table_state(A),
+                sorted((r.businessDay, r.bucket, r.menu_id, r.quantity, r.amount)
+                       for r in s.query(A.SalesLedger)),
+            )
+
+    live = views()
+    rebuild_all(A)
+    assert views() == live
+
+    # 영업일 경계: 조리 안 된 항목이 남은 채 영업일이 바뀌면 live 도 비워진다
+    customer.post("/order", data={
+        "tableNumber": "5", "isFirstOrder": "true", "peopleCount": "2",
+        "noticeChecked": "on", f"qty_{main.id}": "3",
+    })
+    next_pk = db.query(A.Order.id).order_by(A.Order.id.desc()).limit(1).scalar()
+    client.post(f"/admin/confirm/{next_pk}")
+    assert views()[0][main.id] == 3
+    monkeypatch.setattr(A, "datetime", SimpleNamespace(
+        datetime=Tomorrow, timedelta=datetime.timedelta))
+    A.projector.run_once()
+    live = views()
+    assert not any(live[0].values())
+    rebuild_all(A)
+    assert views() == live
+
+
+def test_empty_unknown_table_emits_nothing(A):
+    with A.SessionLocal() as s:
+        head = s.query(A.func.max(A.OrderEvent.id)).scalar()
+    admin_client(A).post("/admin/empty_table/999")
+    with A.SessionLocal() as s:
+        assert s.query(A.func.max(A.OrderEvent.id)).scalar() == head
+
+
+def test_delivery_completes_order_once(A, db):
+    menus = A.menu_cache.get()
+    main = menus[1]
+    head = db.query(A.func.coalesce(A.func.max(A.OrderEvent.id), 0)).scalar()
+    A.app.test_client().post("/order", data={
+        "tableNumber": "4", "isFirstOrder": "true", "peopleCount": "2",
+        "noticeChecked": "on", f"qty_{main.id}": "2",
+    })
+    order_pk = db.query(A.Order.id).order_by(A.Order.id.desc()).limit(1).scalar()
+    client = admin_client(A)
+    client.post(f"/admin/confirm/{order_pk}")
+    client.post(f"/kitchen/done-item/{main.id}", data={"done_count": "2"})
+    item_id = db.query(A.OrderItem.id).filter_by(order_id=order_pk).scalar()
+    client.post(f"/admin/deliver_item/{item_id}", data={"deliver_count": "2"})
+
+    def completed_events():
+        with A.SessionLocal() as s:
+            return (s.query(A.OrderEvent)
+                     .filter(A.OrderEvent.id > head, A.OrderEvent.order_id == order_pk,
+                             A.OrderEvent.type == "ORDER_COMPLETED")
+                     .count())
+
+    assert completed_events() == 1
+    with A.SessionLocal() as s:
+        assert A.complete_delivered(s, [order_pk]) == []
+        s.commit()
+    assert completed_events() == 1
+    assert db.query(A.Order.status).filter_by(id=order_pk).scalar() == "completed"
+
+
+def test_api_etag_changes_when_lower_event_id_commits_late(A):
+    A.project_now()
+    with A.SessionLocal() as s:
+        head = s.query(A.func.coalesce(A.func.max(A.OrderEvent.id), 0)).scalar()
+    hhmmss, epoch, day = A.now_stamp()
+    row = {"type": "TABLE_EMPTIED", "ts": epoch, "time": hhmmss, "businessDay": day,
+           "role": "admin", "tableNumber": "1"}
+    with A.SessionLocal() as s:
+        s.add(A.OrderEvent(id=head + 2, **row))     # 뒤 id 가 먼저 커밋
+        s.commit()
+    A.project_now()
+    before = A.data_etag("orders")
+    with A.SessionLocal() as s:
+        s.add(A.OrderEvent(id=head + 1, **row))
+        s.commit()
+    A.project_now()
+    assert A.data_etag("orders") != before
+
+
+def test_background_projection_refreshes_local_table_board(A, db, monkeypatch):
+    menus = A.menu_cache.get()
+    A.app.test_client().post("/order", data={
+        "tableNumber": "6", "isFirstOrder": "true", "peopleCount": "2",
+        "noticeChecked": "on", f"qty_{menus[1].id}": "1",
+    })
+    order_pk = db.query(A.Order.id).order_by(A.Order.id.desc()).limit(1).scalar()
+    client = admin_client(A)
+    client.post("/admin/empty_table/6")
+    assert A.table_board.get()["6"].usageStart is None
+    monkeypatch.setattr(A, "project_now", lambda: set())     # 요청 시점 반영 실패
+    client.post(f"/admin/confirm/{order_pk}")
+    A.projector.run_once()
+    assert A.table_board.get()["6"].usageStart is not None
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+운영용 WSGI 진입점
+
+    flask --app app init-db                 # 배포 때 한 번: 스키마/시드
+    python build_assets.py                  # 배포 때 한 번: 정적 자산 해시/압축
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+import 시 DB 접속이나 백그라운드 쓰레드 시작이 없으므로 --preload 로
+master 에서 한 번만 로딩해 worker 들이 fork 로 나눠 쓴다.
+"""
+
+from app import create_app
+
+app = create_app()